@@ -0,0 +1,133 @@
+"""
+Request coalescing helpers for expensive upstream calls.
+
+- SingleFlight / AsyncSingleFlight: concurrent calls with the same key
+  share one execution instead of each doing the work.
+- MicroBatcher: items submitted within a short window are handed to one
+  handler call together, each caller getting its own slice of the result.
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+
+
+class FlightStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def record(self, leader):
+        with self._lock:
+            if leader:
+                self.executed += 1
+            else:
+                self.shared += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'executed': self.executed, 'shared': self.shared}
+
+
+class SingleFlight:
+    """Single-flight across threads."""
+
+    def __init__(self):
+        self.stats = FlightStats()
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        self.stats.record(leader)
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    Single-flight across coroutines on one event loop. The shared work runs
+    as its own task, so a caller that disconnects does not cancel it for
+    the others.
+    """
+
+    def __init__(self):
+        self.stats = FlightStats()
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def run(self, key, func):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+        task = calls.get(key)
+        leader = task is None
+        if leader:
+            task = calls[key] = loop.create_task(func())
+            task.add_done_callback(lambda done: calls.pop(key, None))
+        self.stats.record(leader)
+        return await asyncio.shield(task)
+
+
+class MicroBatcher:
+    """
+    Collects items submitted on one event loop for up to `window` seconds
+    (or until `max_size` are waiting) and passes them to
+    `await handler(items)`, which must return one result per item.
+    """
+
+    def __init__(self, handler, window, max_size):
+        self.handler = handler
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
+        self._running = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            # The loop only keeps weak references to tasks
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,220 @@
+"""
+Process-local request metrics in the Prometheus text format, served at
+/metrics.
+
+MetricsMiddleware times every request and records, per view: latency,
+response size, and the number and total duration of SQL queries it ran.
+Upstream HTTP calls (aitodo.upstream) add their time per host. The
+counters kept elsewhere (upstream connection reuse, plan cache, request
+coalescing) are exported as they are at scrape time.
+
+Values are per process; with several workers, scrape each one or sum them.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                yield (
+                    f'{self.name}_bucket',
+                    _format_labels(self.labelnames, labels, [('le', _format_value(bound))]),
+                    cumulative,
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum', label_text, total
+            yield f'{self.name}_count', label_text, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        `collector()` returns (name, type, help, [(labels dict, value)])
+        tuples, read at every scrape.
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(
+                f'{name}{labels} {_format_value(value)}' for name, labels, value in metric.samples()
+            )
+        for collector in self._collectors:
+            for name, metric_type, help, samples in collector():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.register(Histogram(
+    'http_request_duration_seconds',
+    'Time until the response (or, for streams, its headers) was ready.',
+    ['view', 'method', 'status'],
+))
+response_size = registry.register(Histogram(
+    'http_response_size_bytes',
+    'Response body size; streamed responses are not included.',
+    ['view'],
+    buckets=SIZE_BUCKETS,
+))
+request_db_queries = registry.register(Histogram(
+    'http_request_db_queries',
+    'SQL queries run per request.',
+    ['view'],
+    buckets=QUERY_COUNT_BUCKETS,
+))
+request_db_duration = registry.register(Histogram(
+    'http_request_db_duration_seconds',
+    'Total time per request spent in SQL queries.',
+    ['view'],
+))
+request_upstream_duration = registry.register(Histogram(
+    'http_request_upstream_duration_seconds',
+    'Total time per request spent waiting on upstream HTTP calls.',
+    ['view'],
+))
+upstream_duration = registry.register(Histogram(
+    'upstream_request_duration_seconds',
+    'Duration of single upstream HTTP attempts, until the response headers.',
+    ['host', 'status'],
+))
+
+
+class RequestStats:
+    __slots__ = ('db_queries', 'db_duration', 'upstream_duration')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_duration = 0.0
+        self.upstream_duration = 0.0
+
+
+# Set by MetricsMiddleware; asgiref carries it into sync_to_async threads
+current_request_stats = ContextVar('current_request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_duration += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+# Connections opened before this module was imported
+for _connection in connections.all(initialized_only=True):
+    install_query_recorder(None, _connection)
+
+
+def record_upstream(host, status, seconds):
+    upstream_duration.observe(seconds, host, status)
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.upstream_duration += seconds
+
+
+def record_request(view, method, status, seconds, size, stats):
+    request_duration.observe(seconds, view, method, str(status))
+    if size is not None:
+        response_size.observe(size, view)
+    request_db_queries.observe(stats.db_queries, view)
+    request_db_duration.observe(stats.db_duration, view)
+    request_upstream_duration.observe(stats.upstream_duration, view)
+
+
+@registry.register_collector
+def upstream_counters():
+    from aitodo.upstream import upstream_stats
+
+    hosts = upstream_stats()
+    for counter in ('requests', 'connections_opened', 'retries', 'failures', 'circuit_rejections'):
+        yield (
+            f'upstream_{counter}_total',
+            'counter',
+            f'Upstream {counter.replace("_", " ")} per host.',
+            [({'host': host}, stats[counter]) for host, stats in hosts.items()],
+        )
+    yield (
+        'upstream_circuit_open',
+        'gauge',
+        'Whether the circuit breaker for the host is open.',
+        [({'host': host}, int(stats['circuit_open'])) for host, stats in hosts.items()],
+    )
@@ -0,0 +1,117 @@
+"""
+Publish/subscribe for pushing events to connected clients (see
+api/events.py).
+
+Publishers are ordinary sync code (DRF views run in worker threads under
+ASGI); subscribers are coroutines on the event loop. EVENTS_BROKER picks the
+backend:
+
+- InProcessBroker (default) delivers to subscribers in the same process,
+  which is all a single ASGI worker needs.
+- RedisBroker fans out through Redis PUBLISH/SUBSCRIBE so events reach
+  clients connected to any worker. It only needs `publish` from a sync
+  client and `pubsub()` from a `redis.asyncio` client, so a local stand-in
+  with the same API works too.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Put on a subscriber's queue when it fell too far behind to catch up
+OVERFLOW = object()
+
+
+class InProcessBroker:
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        """
+        Yields an asyncio.Queue of messages published to `channel`, ending
+        with OVERFLOW if the subscriber stops keeping up.
+        """
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers[channel].add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(entry)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+
+def _offer(queue, message):
+    if queue.full():
+        # Drop the backlog; the subscriber has to resync anyway
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(OVERFLOW)
+    else:
+        queue.put_nowait(message)
+
+
+class RedisBroker:
+    def __init__(self, url=None, client=None, async_client_factory=None, queue_size=100):
+        if client is None or async_client_factory is None:
+            import redis
+            import redis.asyncio
+
+            client = client or redis.Redis.from_url(url)
+            async_client_factory = async_client_factory or (lambda: redis.asyncio.Redis.from_url(url))
+        self.client = client
+        self.async_client_factory = async_client_factory
+        self.queue_size = queue_size
+
+    def publish(self, channel, message):
+        self.client.publish(channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        async_client = self.async_client_factory()
+        pubsub = async_client.pubsub()
+        await pubsub.subscribe(channel)
+        queue = asyncio.Queue(self.queue_size)
+
+        async def pump():
+            async for item in pubsub.listen():
+                if item.get('type') == 'message':
+                    _offer(queue, json.loads(item['data']))
+
+        task = asyncio.create_task(pump())
+        try:
+            yield queue
+        finally:
+            task.cancel()
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await async_client.aclose()
+
+
+def build_broker():
+    if settings.EVENTS_REDIS_URL:
+        return RedisBroker(settings.EVENTS_REDIS_URL, queue_size=settings.EVENTS_QUEUE_SIZE)
+    # Any class with the same publish/subscribe interface can be swapped in
+    return import_string(settings.EVENTS_BROKER)(queue_size=settings.EVENTS_QUEUE_SIZE)
+
+
+broker = build_broker()
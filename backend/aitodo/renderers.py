@@ -0,0 +1,70 @@
+"""
+Response renderers.
+
+ORJSONRenderer, the default, encodes dicts, lists, strings and datetimes in
+C. Output matches DRF's JSONRenderer with the default compact/unicode
+settings, including `Z`-suffixed UTC datetimes, so list rows fetched with
+`.values()` can be rendered directly without going through a serializer.
+NDJSONRenderer and CSVRenderer let the todo export negotiate its format.
+"""
+import csv
+import io
+
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_fallback_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Decimals, lazy translation strings etc. take DRF's encoder
+        return orjson.dumps(data, default=_fallback_encoder.default, option=orjson.OPT_UTC_Z)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON. Streaming views write their own body; this
+    renders everything else (errors) as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(
+            data,
+            default=_fallback_encoder.default,
+            option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE
+        )
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    CSV. Streaming views write their own body; a dict (an error) is rendered
+    as a header row and a value row.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if isinstance(data, dict):
+            writer.writerow(data.keys())
+            writer.writerow(data.values())
+        else:
+            writer.writerow([data])
+        return buffer.getvalue().encode(self.charset)
@@ -30,9 +30,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'aitodo.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'aitodo.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,6 +61,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'aitodo.wsgi.application'
+ASGI_APPLICATION = 'aitodo.asgi.application'
 
 # Database
 DATABASES = {
@@ -68,6 +70,32 @@ DATABASES = {
     )
 }
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # AI plans keyed by task list, model and sampling params. LocMemCache
+    # evicts least-recently-used entries once MAX_ENTRIES is reached.
+    'ai_plans': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ai-plans',
+        'TIMEOUT': config('AI_PLAN_CACHE_TTL', default=3600, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('AI_PLAN_CACHE_MAX_ENTRIES', default=1000, cast=int),
+        },
+    },
+    # Per-user /api/todos/stats/ summaries, dropped on every todo write.
+    # Point this at a shared cache when running several worker processes.
+    'todo_stats': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'todo-stats',
+        'OPTIONS': {
+            'MAX_ENTRIES': config('TODO_STATS_CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -99,16 +127,37 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework
+# Trust the signed user_id claim instead of loading the user on every
+# request (see authentication/backends.py)
+JWT_STATELESS_AUTH = config('JWT_STATELESS_AUTH', default=False, cast=bool)
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=1024, cast=int)
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=60, cast=int)
+
+# Refresh tokens revoked on rotation (see authentication/revocation.py).
+# Without a Redis URL/client they are kept in memory and persisted in batches.
+TOKEN_REVOCATION_REDIS_URL = config('TOKEN_REVOCATION_REDIS_URL', default='')
+TOKEN_REVOCATION_REDIS_CLIENT = config('TOKEN_REVOCATION_REDIS_CLIENT', default='')
+TOKEN_REVOCATION_BATCH_SIZE = config('TOKEN_REVOCATION_BATCH_SIZE', default=100, cast=int)
+TOKEN_REVOCATION_FLUSH_INTERVAL = config('TOKEN_REVOCATION_FLUSH_INTERVAL', default=2.0, cast=float)
+TOKEN_REVOCATION_SYNC_INTERVAL = config('TOKEN_REVOCATION_SYNC_INTERVAL', default=5.0, cast=float)
+TOKEN_REVOCATION_PURGE_INTERVAL = config('TOKEN_REVOCATION_PURGE_INTERVAL', default=3600.0, cast=float)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'authentication.backends.StatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH else
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'aitodo.renderers.ORJSONRenderer',
     ),
+    'DEFAULT_THROTTLE_RATES': {
+        # Per user and process (throttle state lives in the default cache)
+        'ai_plan': config('AI_PLAN_RATE', default='20/min'),
+    },
 }
 
 # JWT Settings
@@ -133,7 +182,7 @@ SIMPLE_JWT = {
     'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_USER_CLASS': 'authentication.backends.HydratingTokenUser',
     'JTI_CLAIM': 'jti',
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
@@ -155,6 +204,98 @@ GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID', default='')
 
 # GitHub API
 GITHUB_TOKEN = config('GITHUB_TOKEN', default='')
+# OpenAI-compatible chat completions endpoint and model used for plans;
+# point at `python -m benchmarks.stub_inference` to run without the real service.
+AI_INFERENCE_URL = config('AI_INFERENCE_URL', default='https://models.github.ai/inference/chat/completions')
+AI_MODEL = config('AI_MODEL', default='deepseek/DeepSeek-V3-0324')
+AI_PLAN_CACHE = 'ai_plans'
+TODO_STATS_CACHE = 'todo_stats'
+TODO_STATS_CACHE_TTL = config('TODO_STATS_CACHE_TTL', default=300, cast=int)
+# Threads per process running queued planning jobs; 0 leaves jobs for
+# `manage.py process_planning_jobs`.
+AI_PLAN_JOB_WORKERS = config('AI_PLAN_JOB_WORKERS', default=4, cast=int)
+# Upstream plan calls in flight per process; identical concurrent requests
+# share one call. A batch window > 0 (seconds) groups plans of up to
+# AI_PLAN_BATCH_MAX_TASKS tasks from different requests into one completion.
+AI_PLAN_MAX_CONCURRENCY = config('AI_PLAN_MAX_CONCURRENCY', default=8, cast=int)
+AI_PLAN_BATCH_WINDOW = config('AI_PLAN_BATCH_WINDOW', default=0.0, cast=float)
+AI_PLAN_BATCH_MAX_TASKS = config('AI_PLAN_BATCH_MAX_TASKS', default=5, cast=int)
+AI_PLAN_BATCH_MAX_PLANS = config('AI_PLAN_BATCH_MAX_PLANS', default=4, cast=int)
+
+# How long deletions are kept for /api/todos/changes/; clients whose cursor
+# is older get a full resync.
+TODO_TOMBSTONE_RETENTION_DAYS = config('TODO_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+# Longest a multi-todo write (bulk, import, applied plan) may take before it
+# is rolled back; /changes/ looks back this far (see api/changes.py).
+TODO_WRITE_MAX_SECONDS = config('TODO_WRITE_MAX_SECONDS', default=30.0, cast=float)
+
+# Outbound HTTP (GitHub AI inference, Google)
+UPSTREAM_TIMEOUT = config('UPSTREAM_TIMEOUT', default=30.0, cast=float)
+UPSTREAM_CONNECT_TIMEOUT = config('UPSTREAM_CONNECT_TIMEOUT', default=5.0, cast=float)
+UPSTREAM_MAX_CONNECTIONS = config('UPSTREAM_MAX_CONNECTIONS', default=200, cast=int)
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = config('UPSTREAM_MAX_KEEPALIVE_CONNECTIONS', default=50, cast=int)
+UPSTREAM_MAX_RETRIES = config('UPSTREAM_MAX_RETRIES', default=2, cast=int)
+UPSTREAM_BACKOFF_BASE = config('UPSTREAM_BACKOFF_BASE', default=0.5, cast=float)
+UPSTREAM_BACKOFF_MAX = config('UPSTREAM_BACKOFF_MAX', default=8.0, cast=float)
+UPSTREAM_CIRCUIT_THRESHOLD = config('UPSTREAM_CIRCUIT_THRESHOLD', default=5, cast=int)
+UPSTREAM_CIRCUIT_COOLDOWN = config('UPSTREAM_CIRCUIT_COOLDOWN', default=30.0, cast=float)
+
+# Planning jobs still running this many seconds after being claimed are
+# assumed lost with their process and queued again. The default allows for
+# every upstream attempt and backoff, plus a margin.
+AI_PLAN_JOB_LEASE = config(
+    'AI_PLAN_JOB_LEASE',
+    default=(UPSTREAM_MAX_RETRIES + 1) * (UPSTREAM_TIMEOUT + UPSTREAM_BACKOFF_MAX) + 60,
+    cast=float
+)
+AI_PLAN_JOB_SWEEP_INTERVAL = config('AI_PLAN_JOB_SWEEP_INTERVAL', default=60.0, cast=float)
+
+# Server-sent todo change events (see aitodo/pubsub.py and api/events.py).
+# Set EVENTS_REDIS_URL when running more than one worker process.
+EVENTS_BROKER = config('EVENTS_BROKER', default='aitodo.pubsub.InProcessBroker')
+EVENTS_REDIS_URL = config('EVENTS_REDIS_URL', default='')
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=100, cast=int)
+EVENTS_HEARTBEAT_INTERVAL = config('EVENTS_HEARTBEAT_INTERVAL', default=15.0, cast=float)
+# Streams are closed after this long and the browser reconnects
+EVENTS_STREAM_MAX_AGE = config('EVENTS_STREAM_MAX_AGE', default=300.0, cast=float)
+
+# Prometheus metrics at /metrics (see aitodo/metrics.py). With a token set,
+# scrapers send `Authorization: Bearer <token>`; without one only local
+# requests are answered.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# JSON log lines on stderr. Debug records (e.g. rejected sign-ins) are only
+# formatted and written with LOG_LEVEL=DEBUG.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {'()': 'aitodo.log.StructuredFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        # Replaces Django's own console handler, which would print twice
+        'django': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        # One INFO line per HTTP request; upstream timings are in /metrics
+        'httpx': {
+            'level': 'WARNING',
+        },
+    },
+}
 
 # Security Settings
 if not DEBUG:
@@ -0,0 +1,125 @@
+import asyncio
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+from aitodo import upstream
+
+URL = 'http://upstream.test/v1'
+
+
+def stub_upstream(handler):
+    """
+    Sends upstream calls to `handler` (an httpx.MockTransport handler) through
+    fresh clients, with fresh per-host breakers and counters.
+    """
+    options = {**upstream.client_options(), 'transport': httpx.MockTransport(handler)}
+    return mock.patch.multiple(upstream, client_options=lambda: options, _client=None, _hosts={})
+
+
+class AsyncClientLifetimeTests(SimpleTestCase):
+    def test_client_is_closed_when_its_loop_ends(self):
+        async def call():
+            await upstream.arequest('GET', URL)
+            return upstream.get_async_client()
+
+        with stub_upstream(lambda request: httpx.Response(200)):
+            client = asyncio.run(call())
+
+        self.assertTrue(client.is_closed)
+
+
+class Recorder:
+    """A MockTransport handler that answers with `responses` in turn and counts calls."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@override_settings(
+    UPSTREAM_MAX_RETRIES=2,
+    UPSTREAM_BACKOFF_BASE=0,
+    UPSTREAM_BACKOFF_MAX=0,
+    UPSTREAM_CIRCUIT_THRESHOLD=3,
+    UPSTREAM_CIRCUIT_COOLDOWN=60,
+)
+class UpstreamRetryTests(SimpleTestCase):
+    def test_429_and_5xx_are_retried(self):
+        handler = Recorder(httpx.Response(429, headers={'Retry-After': '1'}), httpx.Response(502), httpx.Response(200))
+
+        with stub_upstream(handler):
+            response = upstream.request('GET', URL)
+            stats = upstream.upstream_stats()['upstream.test']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(handler.calls, 3)
+        self.assertEqual(stats['retries'], 2)
+
+    def test_last_response_is_returned_once_retries_run_out(self):
+        handler = Recorder(*[httpx.Response(503) for _ in range(3)])
+
+        with stub_upstream(handler):
+            response = asyncio.run(upstream.arequest('GET', URL))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(handler.calls, 3)
+
+    def test_client_errors_are_not_retried(self):
+        handler = Recorder(httpx.Response(400))
+
+        with stub_upstream(handler):
+            response = upstream.request('GET', URL)
+
+        self.assertEqual((response.status_code, handler.calls), (400, 1))
+
+    def test_transport_errors_are_retried_then_raised(self):
+        handler = Recorder(*[httpx.ConnectError('refused') for _ in range(3)])
+
+        with stub_upstream(handler), self.assertRaises(httpx.ConnectError):
+            upstream.request('GET', URL)
+        self.assertEqual(handler.calls, 3)
+
+    @override_settings(UPSTREAM_MAX_RETRIES=0)
+    def test_breaker_opens_after_repeated_failures_and_recovers(self):
+        handler = Recorder(*[httpx.Response(500) for _ in range(3)], httpx.Response(200))
+
+        with stub_upstream(handler):
+            for _ in range(3):
+                upstream.request('GET', URL)
+            with self.assertRaises(upstream.CircuitOpenError):
+                upstream.request('GET', URL)
+            self.assertEqual(handler.calls, 3)
+
+            # Cooldown over: one trial call goes through and closes the circuit
+            breaker = upstream.get_host_state(URL).breaker
+            breaker.cooldown = 0
+            response = upstream.request('GET', URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(breaker.is_open)
+
+    def test_stream_is_retried_only_before_the_body_starts(self):
+        async def failing_body():
+            yield b'data: partial\n\n'
+            raise httpx.ReadError('connection reset')
+
+        handler = Recorder(httpx.Response(503), httpx.Response(200, content=failing_body()))
+
+        async def read():
+            chunks = []
+            async with upstream.astream('POST', URL) as response:
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+            return chunks
+
+        with stub_upstream(handler), self.assertRaises(httpx.ReadError):
+            asyncio.run(read())
+        self.assertEqual(handler.calls, 2)
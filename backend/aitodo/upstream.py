@@ -0,0 +1,279 @@
+"""
+Shared HTTP clients for upstream calls (GitHub AI inference, Google).
+
+Requests go through pooled, keep-alive httpx clients: one sync client per
+process and one async client per event loop (under the ASGI worker that is
+one per process), so repeated calls reuse connections instead of paying a
+TCP+TLS handshake each. An async client is closed when its loop ends, so
+the short-lived loops async views get under WSGI do not leave connections
+open. On top of the pool:
+
+- 429/5xx responses and transport errors are retried with jittered
+  exponential backoff (honouring a numeric Retry-After),
+- a per-host circuit breaker fails fast while an upstream keeps failing,
+- per-host counters record requests, new connections, retries and failures
+  so connection reuse is visible (see `upstream_stats()`),
+- every attempt's duration goes to the /metrics histograms (aitodo.metrics).
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+from aitodo.metrics import record_upstream
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """The upstream host failed repeatedly and is not being called for now."""
+
+    def __init__(self, host):
+        super().__init__(f'{host} is failing; not retrying until the circuit closes')
+        self.host = host
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. Once `cooldown` seconds have
+    passed a single trial call is let through (half-open); its outcome closes
+    the circuit again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class HostState:
+    COUNTERS = ('requests', 'connections_opened', 'retries', 'failures', 'circuit_rejections')
+
+    def __init__(self, host):
+        self.host = host
+        self.breaker = CircuitBreaker(
+            settings.UPSTREAM_CIRCUIT_THRESHOLD,
+            settings.UPSTREAM_CIRCUIT_COOLDOWN
+        )
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def incr(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def trace(self, event_name, info):
+        # httpcore emits this only when a new TCP connection is opened
+        if event_name == 'connection.connect_tcp.complete':
+            self.incr('connections_opened')
+
+    async def atrace(self, event_name, info):
+        self.trace(event_name, info)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['connections_reused'] = max(stats['requests'] - stats['connections_opened'], 0)
+        stats['circuit_open'] = self.breaker.is_open
+        return stats
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_host_state(url):
+    host = urlsplit(str(url)).netloc
+    with _hosts_lock:
+        state = _hosts.get(host)
+        if state is None:
+            state = _hosts[host] = HostState(host)
+        return state
+
+
+def upstream_stats():
+    with _hosts_lock:
+        states = list(_hosts.values())
+    return {state.host: state.snapshot() for state in states}
+
+
+def client_options():
+    return {
+        'timeout': httpx.Timeout(settings.UPSTREAM_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT),
+        'limits': httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+    }
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(**client_options())
+        return _client
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(**client_options())
+        loop.create_task(_close_with_loop(loop, client))
+    return client
+
+
+async def _close_with_loop(loop, client):
+    # Waits until the loop cancels its remaining tasks as it ends (asyncio.run,
+    # and so async_to_sync, does this), then closes the client's connections
+    try:
+        await loop.create_future()
+    finally:
+        if _async_clients.get(loop) is client:
+            del _async_clients[loop]
+        await client.aclose()
+
+
+async def aclose_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def backoff_delay(attempt, response=None):
+    if response is not None:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(float(retry_after), settings.UPSTREAM_BACKOFF_MAX)
+    # Full jitter: spreads retries from concurrent callers apart
+    return random.uniform(0, min(settings.UPSTREAM_BACKOFF_MAX, settings.UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _start_attempt(state):
+    if not state.breaker.allow():
+        state.incr('circuit_rejections')
+        raise CircuitOpenError(state.host)
+    state.incr('requests')
+
+
+def _finish_attempt(state, response, error, attempt, started):
+    """
+    Records the outcome of one attempt and returns True if it should be retried.
+    """
+    record_upstream(
+        state.host,
+        response.status_code if response is not None else type(error).__name__,
+        time.perf_counter() - started
+    )
+    if error is None and response.status_code not in RETRY_STATUSES:
+        state.breaker.record_success()
+        return False
+    state.incr('failures')
+    state.breaker.record_failure()
+    if attempt >= settings.UPSTREAM_MAX_RETRIES:
+        if error is not None:
+            raise error
+        return False
+    state.incr('retries')
+    return True
+
+
+def request(method, url, **kwargs):
+    state = get_host_state(url)
+    attempt = 0
+    while True:
+        _start_attempt(state)
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = get_client().request(method, url, extensions={'trace': state.trace}, **kwargs)
+        except httpx.TransportError as e:
+            error = e
+        if not _finish_attempt(state, response, error, attempt, started):
+            return response
+        time.sleep(backoff_delay(attempt, response))
+        attempt += 1
+
+
+async def arequest(method, url, **kwargs):
+    state = get_host_state(url)
+    attempt = 0
+    while True:
+        _start_attempt(state)
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = await get_async_client().request(
+                method, url, extensions={'trace': state.atrace}, **kwargs
+            )
+        except httpx.TransportError as e:
+            error = e
+        if not _finish_attempt(state, response, error, attempt, started):
+            return response
+        await asyncio.sleep(backoff_delay(attempt, response))
+        attempt += 1
+
+
+@asynccontextmanager
+async def astream(method, url, **kwargs):
+    """
+    Like arequest, but yields the response before its body is read. Only
+    failures before the body starts streaming are retried.
+    """
+    state = get_host_state(url)
+    client = get_async_client()
+    attempt = 0
+    while True:
+        _start_attempt(state)
+        started = time.perf_counter()
+        response, error = None, None
+        try:
+            request = client.build_request(method, url, extensions={'trace': state.atrace}, **kwargs)
+            response = await client.send(request, stream=True)
+        except httpx.TransportError as e:
+            error = e
+        if not _finish_attempt(state, response, error, attempt, started):
+            break
+        if response is not None:
+            await response.aclose()
+        await asyncio.sleep(backoff_delay(attempt, response))
+        attempt += 1
+    try:
+        yield response
+    finally:
+        await response.aclose()
@@ -1,15 +1,31 @@
+import hmac
+
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
-from rest_framework_simplejwt.views import TokenRefreshView
+from django.http import Http404, HttpResponse, JsonResponse
+from aitodo.metrics import registry
+from authentication.views import RevokingTokenRefreshView
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
 
 def health_check(request):
     return JsonResponse({'status': 'ok', 'message': 'AIT3 Backend is running'})
 
+def metrics(request):
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'.encode()
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+            raise Http404
+    elif request.META.get('REMOTE_ADDR') not in LOCAL_ADDRESSES:
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 urlpatterns = [
     path('', health_check, name='health_check'),
+    path('metrics', metrics, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/auth/', include('authentication.urls')),
     path('api/todos/', include('api.urls')),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/refresh/', RevokingTokenRefreshView.as_view(), name='token_refresh'),
 ] 
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+    
+    def ready(self):
+        from django.core.signals import request_started
+        from .jobs import start_job_sweeper
+        request_started.connect(start_job_sweeper, dispatch_uid='api.start_job_sweeper')
@@ -0,0 +1,88 @@
+"""
+Incremental sync for /api/todos/changes/.
+
+A sync cursor is the server time of the previous sync, in microseconds since
+the epoch. Rows with a newer `updated_at` are sent in full; deletions are
+read from TodoTombstone, which every delete path writes via
+`record_deletions`. Both lookups use a (user, timestamp) index, so a sync
+costs in proportion to what changed.
+
+A row's updated_at is taken when it is written, not when its transaction
+commits, so a sync looks back far enough to cover the longest write:
+multi-row writes run in todo_write_transaction(), which rolls back rather
+than commit more than TODO_WRITE_MAX_SECONDS after it started. Clients
+apply changes idempotently, so rows sent twice are harmless.
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .exceptions import TodoWriteTimeout
+from .models import TodoTombstone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# On top of the longest write: time to commit, and clock drift between servers
+CURSOR_MARGIN = timedelta(seconds=2)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(moment):
+    return str((moment - EPOCH) // timedelta(microseconds=1))
+
+
+def decode_cursor(cursor):
+    try:
+        return EPOCH + timedelta(microseconds=int(cursor))
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidCursor(cursor)
+
+
+def cursor_overlap():
+    return timedelta(seconds=settings.TODO_WRITE_MAX_SECONDS) + CURSOR_MARGIN
+
+
+@contextmanager
+def todo_write_transaction():
+    """
+    transaction.atomic() for writes of several todos. Raises TodoWriteTimeout,
+    rolling back, if the block took longer than TODO_WRITE_MAX_SECONDS:
+    committing it could hide its rows from syncs that already passed them.
+    """
+    started = time.monotonic()
+    with transaction.atomic():
+        yield
+        if time.monotonic() - started > settings.TODO_WRITE_MAX_SECONDS:
+            raise TodoWriteTimeout()
+
+
+def record_deletions(user_id, todo_ids):
+    TodoTombstone.objects.bulk_create([
+        TodoTombstone(user_id=user_id, todo_id=todo_id) for todo_id in dict.fromkeys(todo_ids)
+    ])
+
+
+def get_changes(queryset, user_id, since=None):
+    """
+    Returns (changed todos, deleted todo ids, new cursor, full). Without a
+    cursor, or with one older than the tombstone retention, everything is
+    returned with full=True and the client should replace its copy.
+    """
+    now = timezone.now()
+    retention = timedelta(days=settings.TODO_TOMBSTONE_RETENTION_DAYS)
+    if since is None or since < now - retention:
+        return queryset.order_by('updated_at', 'id'), [], encode_cursor(now), True
+    
+    since -= cursor_overlap()
+    changed = queryset.filter(updated_at__gte=since).order_by('updated_at', 'id')
+    deleted = list(
+        TodoTombstone.objects.filter(user_id=user_id, deleted_at__gte=since)
+        .order_by('deleted_at')
+        .values_list('todo_id', flat=True)
+    )
+    return changed, deleted, encode_cursor(now), False
@@ -0,0 +1,51 @@
+"""
+Validators for conditional GETs on the todo endpoints.
+
+Every write to a todo is a create, a delete, or a save/bulk_update that
+bumps its auto_now `updated_at`, so a user's todo count plus their latest
+`updated_at` identifies the state of their list. Both come from one
+aggregate over api_todo_user_updated_idx; a matching If-None-Match is
+answered with 304 before any row is loaded or serialized.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def todo_list_etag(request, queryset):
+    state = queryset.order_by().aggregate(count=Count('id'), last_updated=Max('updated_at'))
+    # Filters, ordering and the cursor are all in the query string
+    return make_etag(request.user.id, state['count'], state['last_updated'], request.get_full_path())
+
+
+def todo_etag(todo):
+    return make_etag(todo.pk, todo.updated_at)
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    The 304 response for a request whose validators still match, else None.
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+    return set_validators(response, etag, last_modified) if response is not None else None
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user data: browsers may keep it but have to revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
@@ -0,0 +1,67 @@
+"""
+Per-user todo change events, pushed to the browser as Server-Sent Events
+from /api/todos/events/ so clients no longer poll the list.
+
+Each event is published after its transaction commits. A stream starts
+with a `ready` event carrying a /api/todos/changes/ cursor, so a client
+that reconnects can fetch whatever it missed in between. A client that
+falls too far behind gets a `resync` event and the stream ends.
+"""
+import asyncio
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from aitodo.pubsub import OVERFLOW, broker
+from .changes import encode_cursor
+
+
+def user_channel(user_id):
+    return f'todos:{user_id}'
+
+
+def publish_todo_events(user_id, events):
+    """
+    Publishes (event name, data) pairs to the user's stream once the
+    current transaction commits.
+    """
+    if not events:
+        return
+    channel = user_channel(user_id)
+
+    def publish():
+        for event, data in events:
+            broker.publish(channel, {'event': event, 'data': data})
+
+    transaction.on_commit(publish)
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+async def event_stream(user_id):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENTS_STREAM_MAX_AGE
+    async with broker.subscribe(user_channel(user_id)) as queue:
+        # Reconnect delay for EventSource, in milliseconds
+        yield b'retry: 3000\n\n'
+        yield format_event('ready', {'cursor': encode_cursor(timezone.now())})
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(),
+                    timeout=min(settings.EVENTS_HEARTBEAT_INTERVAL, remaining)
+                )
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield b': ping\n\n'
+                continue
+            if message is OVERFLOW:
+                yield format_event('resync', {})
+                return
+            yield format_event(message['event'], message['data'])
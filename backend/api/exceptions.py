@@ -0,0 +1,14 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class TodoConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This todo was modified by another request. Reload it and try again.'
+    default_code = 'conflict'
+
+
+class TodoWriteTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The change took too long to save and was not applied. Try again with fewer todos.'
+    default_code = 'write_timeout'
@@ -0,0 +1,109 @@
+from datetime import datetime, time
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from .models import Todo
+
+# Must stay identical to the expression of the api_todo_search_gin index
+# (see migration 0004) for Postgres to use it.
+SEARCH_VECTOR = SearchVector('title', 'description', config='english')
+
+PRIORITY_RANK = Case(
+    When(priority='low', then=Value(1)),
+    When(priority='medium', then=Value(2)),
+    When(priority='high', then=Value(3)),
+    output_field=IntegerField(),
+)
+
+
+class TodoFilterBackend(BaseFilterBackend):
+    """
+    Filters the todo list by ?status=, ?priority= (comma separated values),
+    ?due_date_after= / ?due_date_before= (ISO dates or datetimes) and ?search=.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        statuses = self.get_choices(params, 'status', Todo.STATUS_CHOICES)
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+
+        priorities = self.get_choices(params, 'priority', Todo.PRIORITY_CHOICES)
+        if priorities:
+            queryset = queryset.filter(priority__in=priorities)
+
+        due_after = self.get_datetime(params, 'due_date_after')
+        if due_after is not None:
+            queryset = queryset.filter(due_date__gte=due_after)
+
+        due_before = self.get_datetime(params, 'due_date_before', end_of_day=True)
+        if due_before is not None:
+            queryset = queryset.filter(due_date__lte=due_before)
+
+        term = params.get('search', '').strip()
+        if term:
+            queryset = self.search(queryset, term)
+
+        return queryset
+
+    def get_choices(self, params, name, choices):
+        raw = params.get(name)
+        if not raw:
+            return []
+        values = [value.strip() for value in raw.split(',') if value.strip()]
+        valid = {key for key, _ in choices}
+        invalid = [value for value in values if value not in valid]
+        if invalid:
+            raise ValidationError({name: [f"Invalid choice: {', '.join(invalid)}."]})
+        return values
+
+    def get_datetime(self, params, name, end_of_day=False):
+        raw = params.get(name)
+        if not raw:
+            return None
+        try:
+            value = parse_datetime(raw)
+            if value is None:
+                day = parse_date(raw)
+                if day is None:
+                    raise ValueError
+                value = datetime.combine(day, time.max if end_of_day else time.min)
+        except ValueError:
+            raise ValidationError({name: ['Enter a valid date or datetime.']})
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    def search(self, queryset, term):
+        if connection.vendor == 'postgresql':
+            return queryset.alias(search_vector=SEARCH_VECTOR).filter(
+                search_vector=SearchQuery(term, config='english', search_type='websearch')
+            )
+        return queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+
+
+class TodoOrderingFilter(OrderingFilter):
+    """
+    Single-key ?ordering= for the keyset-paginated list. `priority` sorts by
+    rank (low < medium < high) rather than alphabetically.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Keyset pagination seeks on one sort key plus the primary key.
+        key = ordering[0]
+        if key.lstrip('-') == 'priority':
+            key = key.replace('priority', 'priority_rank')
+        return (key,)
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if ordering[0].lstrip('-') == 'priority_rank':
+            queryset = queryset.annotate(priority_rank=PRIORITY_RANK)
+        return queryset.order_by(*ordering, '-id' if ordering[0].startswith('-') else 'id')
@@ -0,0 +1,152 @@
+"""
+Asynchronous planning jobs (POST /api/todos/plan/?async=true).
+
+Jobs are PlanningJob rows run by an in-process thread pool or, with
+AI_PLAN_JOB_WORKERS = 0, by `manage.py process_planning_jobs`. A worker
+claims a job by moving it from pending to running. A job whose process
+died is recovered: running jobs older than AI_PLAN_JOB_LEASE go back to
+pending, and a sweeper thread started with the first request hands
+pending jobs to the pool every AI_PLAN_JOB_SWEEP_INTERVAL seconds.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+from .models import PlanningJob
+from .planning import get_plan, plan_error
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+# Ids submitted to this process's pool and not finished yet
+_queued = set()
+_queued_lock = threading.Lock()
+_sweeper = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.AI_PLAN_JOB_WORKERS,
+            thread_name_prefix='ai-plan'
+        )
+    return _executor
+
+
+def enqueue_planning_job(user, tasks):
+    """
+    Persists a planning job and hands it to the in-process worker pool once
+    the surrounding transaction commits. With AI_PLAN_JOB_WORKERS = 0 jobs are
+    left pending for the process_planning_jobs management command.
+    """
+    job = PlanningJob.objects.create(user_id=user.id, tasks=tasks)
+    if settings.AI_PLAN_JOB_WORKERS > 0:
+        transaction.on_commit(lambda: submit_planning_job(job.pk))
+    return job
+
+
+def submit_planning_job(job_id):
+    with _queued_lock:
+        if job_id in _queued:
+            return
+        _queued.add(job_id)
+    get_executor().submit(run_planning_job_in_thread, job_id)
+
+
+def run_planning_job_in_thread(job_id):
+    # Worker threads get their own DB connection; don't let it go stale.
+    close_old_connections()
+    try:
+        run_planning_job(job_id)
+    finally:
+        close_old_connections()
+        with _queued_lock:
+            _queued.discard(job_id)
+
+
+def reclaim_stale_jobs():
+    """
+    Puts running jobs claimed more than AI_PLAN_JOB_LEASE seconds ago back
+    to pending; their worker is gone. Returns how many.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.AI_PLAN_JOB_LEASE)
+    return PlanningJob.objects.filter(status='running', updated_at__lt=cutoff).update(
+        status='pending',
+        updated_at=timezone.now()
+    )
+
+
+def pending_job_ids(limit=100):
+    """Ids of pending jobs, oldest first."""
+    return list(
+        PlanningJob.objects.filter(status='pending')
+        .order_by('created_at')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def sweep_planning_jobs():
+    """
+    Reclaims stale jobs and submits pending ones to the pool, e.g. those
+    left behind by a restarted process.
+    """
+    reclaimed = reclaim_stale_jobs()
+    if reclaimed:
+        logger.warning('Re-queued %d stale planning jobs', reclaimed)
+    for job_id in pending_job_ids():
+        submit_planning_job(job_id)
+
+
+def _sweep_forever():
+    while True:
+        try:
+            sweep_planning_jobs()
+        except Exception:
+            logger.exception('Planning job sweep failed')
+        finally:
+            # The sweeper's own connection, idle until the next sweep
+            connections.close_all()
+        time.sleep(settings.AI_PLAN_JOB_SWEEP_INTERVAL)
+
+
+def start_job_sweeper(**kwargs):
+    """
+    Starts the sweeper thread once per process (connected to
+    request_started, so that management commands do not start it).
+    """
+    global _sweeper
+    if _sweeper is not None or settings.AI_PLAN_JOB_WORKERS <= 0:
+        return
+    with _queued_lock:
+        if _sweeper is not None:
+            return
+        _sweeper = threading.Thread(target=_sweep_forever, name='ai-plan-sweeper', daemon=True)
+    _sweeper.start()
+
+
+def run_planning_job(job_id):
+    """
+    Claims a pending job and runs it. Returns False if another worker got it first.
+    """
+    claimed = PlanningJob.objects.filter(pk=job_id, status='pending').update(
+        status='running',
+        updated_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    job = PlanningJob.objects.get(pk=job_id)
+    try:
+        job.result = get_plan(job.tasks)
+        job.status = 'succeeded'
+    except Exception as e:
+        job.error, job.error_status = plan_error(e)
+        job.status = 'failed'
+    job.save(update_fields=['status', 'result', 'error', 'error_status', 'updated_at'])
+    return True
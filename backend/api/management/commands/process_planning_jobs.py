@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api.jobs import pending_job_ids, reclaim_stale_jobs, run_planning_job
+
+
+class Command(BaseCommand):
+    help = 'Runs pending AI planning jobs, oldest first, after re-queuing stale running ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls with --watch')
+
+    def handle(self, *args, **options):
+        while True:
+            reclaimed = reclaim_stale_jobs()
+            if reclaimed:
+                self.stdout.write(f'Re-queued {reclaimed} stale planning jobs')
+            job_ids = pending_job_ids()
+            for job_id in job_ids:
+                if run_planning_job(job_id):
+                    self.stdout.write(f'Processed planning job {job_id}')
+            if not options['watch']:
+                break
+            if not job_ids:
+                time.sleep(options['interval'])
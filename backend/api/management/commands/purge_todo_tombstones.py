@@ -0,0 +1,15 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import TodoTombstone
+
+
+class Command(BaseCommand):
+    help = 'Deletes todo tombstones older than TODO_TOMBSTONE_RETENTION_DAYS'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.TODO_TOMBSTONE_RETENTION_DAYS)
+        deleted, _ = TodoTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(f'Purged {deleted} todo tombstones')
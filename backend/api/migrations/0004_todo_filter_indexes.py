@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:43
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+SEARCH_INDEX = GinIndex(
+    SearchVector('title', 'description', config='english'),
+    name='api_todo_search_gin',
+)
+
+
+def add_search_index(apps, schema_editor):
+    # Full-text search only exists on Postgres; SQLite falls back to LIKE.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('api', 'Todo'), SEARCH_INDEX)
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('api', 'Todo'), SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_todo_user_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='api_todo_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='api_todo_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'priority', '-created_at', '-id'], name='api_todo_user_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('due_date__isnull', False)), fields=['user', 'due_date', 'id'], name='api_todo_user_due_idx'),
+        ),
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
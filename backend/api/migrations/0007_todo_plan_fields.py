@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_todotombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='estimated_minutes',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='plan_order',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -23,11 +26,71 @@ class Todo(models.Model):
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
     due_date = models.DateTimeField(null=True, blank=True)
+    # Set when the todo comes from an applied AI plan
+    plan_order = models.PositiveIntegerField(null=True, blank=True)
+    estimated_minutes = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='api_todo_user_created_idx'),
+            models.Index(fields=['user', '-updated_at', '-id'], name='api_todo_user_updated_idx'),
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='api_todo_user_status_idx'),
+            models.Index(fields=['user', 'priority', '-created_at', '-id'], name='api_todo_user_priority_idx'),
+            models.Index(
+                fields=['user', 'due_date', 'id'],
+                name='api_todo_user_due_idx',
+                condition=models.Q(due_date__isnull=False),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} - {self.user.email}" 
+
+
+class TodoTombstone(models.Model):
+    """
+    Marks a deleted todo so that incremental sync (/api/todos/changes/) can
+    tell clients to drop it. Purged after TODO_TOMBSTONE_RETENTION_DAYS.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='todo_tombstones')
+    todo_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='api_tombstone_user_idx'),
+            models.Index(fields=['deleted_at'], name='api_tombstone_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Deleted todo {self.todo_id} - {self.user.email}"
+
+class PlanningJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='planning_jobs')
+    tasks = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    error_status = models.PositiveSmallIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='api_planjob_status_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.title} - {self.user.email}" 
\ No newline at end of file
+        return f"Planning job {self.id} ({self.status}) - {self.user.email}"
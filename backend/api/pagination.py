@@ -0,0 +1,145 @@
+import json
+from datetime import date
+
+from django.db.models import F, Q
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class TodoCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (sort key, id) so list latency does not grow with
+    the number of todos a user has. The default (created_at, id) ordering is
+    backed by the (user, -created_at, -id) index.
+
+    Unlike DRF's position/offset cursor, the position always carries the
+    primary key, so low-cardinality (priority) or nullable (due_date) sort
+    keys page correctly without falling back to OFFSET.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (reverse, current_position) = (False, None)
+        else:
+            (reverse, current_position) = (self.cursor.reverse, self.cursor.position)
+
+        queryset = queryset.order_by(*self._get_order_by(queryset, reverse))
+        if current_position is not None:
+            queryset = queryset.filter(
+                self._get_seek_filter(queryset, self._decode_position(current_position), reverse)
+            )
+
+        # Fetch one extra row to know whether there is a following page.
+        results = list(queryset[:self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        key = ordering[0]
+        if key.lstrip('-') == 'id':
+            return (key,)
+        # Break ties on the primary key, in the same direction as the sort key.
+        return (key, '-id' if key.startswith('-') else 'id')
+
+    def _split_ordering(self, reverse):
+        key = self.ordering[0]
+        descending = key.startswith('-') != reverse
+        return key.lstrip('-'), descending
+
+    def _is_nullable(self, queryset, name):
+        try:
+            return queryset.model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            return False
+
+    def _get_order_by(self, queryset, reverse):
+        name, descending = self._split_ordering(reverse)
+        # Rows with no value sort last when paging forward (first when reversed).
+        # Only request explicit NULLS placement for nullable keys so the
+        # non-null created_at/updated_at orderings still match their indexes.
+        nulls = {}
+        if self._is_nullable(queryset, name):
+            nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        key = F(name).desc(**nulls) if descending else F(name).asc(**nulls)
+        if name == 'id':
+            return (key,)
+        return (key, F('id').desc() if descending else F('id').asc())
+
+    def _get_seek_filter(self, queryset, position, reverse):
+        value, pk = position
+        name, descending = self._split_ordering(reverse)
+        lookup = 'lt' if descending else 'gt'
+
+        if name == 'id':
+            return Q(**{f'id__{lookup}': pk})
+
+        same_value_after = Q(**{f'id__{lookup}': pk})
+        if value is None:
+            seek = Q(**{f'{name}__isnull': True}) & same_value_after
+            if reverse:
+                seek |= Q(**{f'{name}__isnull': False})
+            return seek
+
+        seek = Q(**{f'{name}__{lookup}': value}) | (Q(**{name: value}) & same_value_after)
+        if not reverse and self._is_nullable(queryset, name):
+            seek |= Q(**{f'{name}__isnull': True})
+        return seek
+
+    def _get_position_from_instance(self, instance, ordering):
+        name = ordering[0].lstrip('-')
+        if isinstance(instance, dict):
+            value, pk = instance[name], instance['id']
+        else:
+            value, pk = getattr(instance, name), instance.pk
+        if isinstance(value, date):
+            # isoformat keeps microsecond precision so the position round-trips exactly.
+            value = value.isoformat()
+        return json.dumps([value, pk], separators=(',', ':'))
+
+    def _decode_position(self, position):
+        try:
+            value, pk = json.loads(position)
+            return value, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
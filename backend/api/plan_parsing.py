@@ -0,0 +1,273 @@
+"""
+Turns model completions into validated plans.
+
+The completion should contain one JSON object, but models wrap it in
+markdown, add prose (sometimes with braces of its own) or stop halfway.
+JSONObjectExtractor scans for the first brace-balanced object that parses,
+skipping over string contents, and can be fed a streamed completion piece
+by piece. The result is checked against PLAN_SCHEMA by a validator built
+once at import time. A bad priority or estimate is repaired in place;
+anything else that does not pass becomes fallback_plan().
+"""
+import re
+
+import orjson
+
+PRIORITIES = ('high', 'medium', 'low')
+
+# Largest value the integer columns (plan_order, estimated_minutes) hold on
+# every supported database
+MAX_COLUMN_INT = 2**31 - 1
+
+INVALID = object()
+
+# estimated_time of a task whose estimate was missing or unusable
+UNKNOWN_ESTIMATE = 'Not estimated'
+
+
+class Repair:
+    """
+    Schema for a field models sometimes get wrong: a value that is missing
+    or does not match `schema` is replaced by `repair(value)` (value is
+    INVALID when missing) instead of invalidating the whole plan.
+    """
+
+    def __init__(self, schema, repair):
+        self.schema = schema
+        self.repair = repair
+
+
+def repair_estimate(value):
+    """Numbers are taken as minutes; anything else is UNKNOWN_ESTIMATE."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 1:
+        return f'{round(min(value, MAX_COLUMN_INT))} minutes'
+    return UNKNOWN_ESTIMATE
+
+
+PLAN_SCHEMA = {
+    'plan': str,
+    'prioritized_tasks': [{
+        'task': str,
+        'priority': Repair(PRIORITIES, lambda value: 'medium'),
+        'estimated_time': Repair(str, repair_estimate),
+        'order': range(1, MAX_COLUMN_INT + 1),
+    }],
+}
+
+# Plan text of a fallback when there is no completion text of its own to
+# show: it was empty, or it is a batch that also holds other lists' plans.
+FALLBACK_TEXT = 'No detailed plan could be generated; tasks are listed in their original order.'
+
+# "45 minutes", "1.5h", "30-45 mins", "1 hour 30 minutes", "1h30m", "2h15m";
+# ranges count at their upper end. A unit may be followed directly by the
+# next amount, but not by more letters ("2 months" is not 2 minutes).
+_DURATION_RE = re.compile(
+    r'(\d+(?:\.\d+)?)(?:\s*(?:-|–|to)\s*(\d+(?:\.\d+)?))?\s*(hours?|hrs?|h|minutes?|mins?|m)(?![a-z])',
+    re.IGNORECASE
+)
+_OPENING_BRACE_RE = re.compile(r'\{')
+_STRUCTURE_RE = re.compile(r'[{}"]')
+_STRING_END_RE = re.compile(r'["\\]')
+
+
+class JSONObjectExtractor:
+    """
+    Finds the first complete JSON object in text that arrives in pieces.
+    feed() returns the object once it is complete, None until then; text is
+    scanned once however it is split, except after a balanced candidate
+    that turns out not to be JSON.
+    """
+
+    def __init__(self):
+        self.value = None
+        self._text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, text):
+        if self.value is None:
+            self._text += text
+            self._scan()
+        return self.value
+
+    def _scan(self):
+        text = self._text
+        pos = self._pos
+        while True:
+            if self._depth == 0:
+                match = _OPENING_BRACE_RE.search(text, pos)
+                if match is None:
+                    # Nothing before the next brace is needed again
+                    self._text, self._pos = '', 0
+                    return
+                text = self._text = text[match.start():]
+                pos = 1
+                self._depth = 1
+            elif self._in_string:
+                match = _STRING_END_RE.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                if match.group() == '\\':
+                    if match.end() == len(text):
+                        # The escaped character has not arrived yet
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                else:
+                    self._in_string = False
+                    pos = match.end()
+            else:
+                match = _STRUCTURE_RE.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                pos = match.end()
+                char = match.group()
+                if char == '"':
+                    self._in_string = True
+                elif char == '{':
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        try:
+                            self.value = orjson.loads(text[:pos])
+                            return
+                        except orjson.JSONDecodeError:
+                            # Prose like "{braces}"; look again after its brace
+                            self._in_string = False
+                            pos = 1
+        self._pos = pos
+
+
+def extract_json_object(content):
+    """The first JSON object in `content`, or None."""
+    return JSONObjectExtractor().feed(content)
+
+
+def compile_validator(schema):
+    """
+    Builds a function that returns a normalized copy of a value matching
+    `schema`, or INVALID. A schema is a type, a tuple of allowed strings
+    (compared case-insensitively), a range of allowed integers, a one-item
+    list for "list of", a dict of required keys (other keys are dropped) or
+    a Repair.
+    """
+    if isinstance(schema, dict):
+        fields = [(key, compile_validator(value)) for key, value in schema.items()]
+
+        def validate(value):
+            if not isinstance(value, dict):
+                return INVALID
+            result = {}
+            for key, validate_field in fields:
+                # A missing key is checked as INVALID, which only a Repair accepts
+                field = validate_field(value.get(key, INVALID))
+                if field is INVALID:
+                    return INVALID
+                result[key] = field
+            return result
+    elif isinstance(schema, list):
+        (item_schema,) = schema
+        validate_item = compile_validator(item_schema)
+
+        def validate(value):
+            if not isinstance(value, list):
+                return INVALID
+            result = [validate_item(item) for item in value]
+            return INVALID if any(item is INVALID for item in result) else result
+    elif isinstance(schema, tuple):
+        choices = frozenset(schema)
+
+        def validate(value):
+            if not isinstance(value, str):
+                return INVALID
+            value = value.strip().lower()
+            return value if value in choices else INVALID
+    elif isinstance(schema, Repair):
+        validate_schema = compile_validator(schema.schema)
+        repair = schema.repair
+
+        def validate(value):
+            result = validate_schema(value)
+            return repair(value) if result is INVALID else result
+    elif schema is str:
+        def validate(value):
+            if not isinstance(value, str):
+                return INVALID
+            value = value.strip()
+            return value or INVALID
+    elif schema is int:
+        def validate(value):
+            return value if isinstance(value, int) and not isinstance(value, bool) else INVALID
+    elif isinstance(schema, range):
+        def validate(value):
+            if not isinstance(value, int) or isinstance(value, bool):
+                return INVALID
+            return value if value in schema else INVALID
+    else:
+        raise TypeError(f'Unsupported schema: {schema!r}')
+    return validate
+
+
+validate_plan_schema = compile_validator(PLAN_SCHEMA)
+
+
+def parse_duration_minutes(text):
+    """
+    Minutes in a free-form estimate such as "2 hours", or None; capped at
+    MAX_COLUMN_INT.
+    """
+    minutes = 0
+    for low, high, unit in _DURATION_RE.findall(text):
+        amount = float(high or low)
+        minutes += amount * 60 if unit[0] in 'hH' else amount
+    return round(min(minutes, MAX_COLUMN_INT)) or None
+
+
+def fallback_plan(content, tasks):
+    """Structured plan synthesized from the task order when the model output is unusable."""
+    return {
+        'plan': content.strip() or FALLBACK_TEXT,
+        'prioritized_tasks': [
+            {
+                'task': task,
+                'priority': 'high' if i < len(tasks) // 3 else 'medium' if i < 2 * len(tasks) // 3 else 'low',
+                'estimated_time': f'{30 + i * 15} minutes',
+                'order': i + 1
+            }
+            for i, task in enumerate(tasks)
+        ]
+    }
+
+
+def plan_from_value(value, content, tasks):
+    """
+    Returns (plan, parsed) for an extracted JSON value, where parsed is
+    False if the fallback plan was used.
+    """
+    plan = validate_plan_schema(value)
+    if plan is INVALID:
+        return fallback_plan(content, tasks), False
+    return plan, True
+
+
+def parse_plan(content, tasks):
+    return plan_from_value(extract_json_object(content), content, tasks)
+
+
+def parse_batch_plan(content, task_lists):
+    """
+    Splits a batched completion ({"plans": [...]}) into one (plan, parsed)
+    pair per task list.
+    """
+    value = extract_json_object(content)
+    plans = value.get('plans') if isinstance(value, dict) else None
+    if not isinstance(plans, list):
+        plans = []
+    return [
+        plan_from_value(plans[i] if i < len(plans) else None, FALLBACK_TEXT, tasks)
+        for i, tasks in enumerate(task_lists)
+    ]
@@ -0,0 +1,389 @@
+import asyncio
+import hashlib
+import json
+import threading
+import weakref
+
+import httpx
+from django.conf import settings
+from django.core.cache import caches
+from aitodo import upstream
+from aitodo.coalescing import AsyncSingleFlight, MicroBatcher, SingleFlight
+from aitodo.metrics import registry
+from .models import Todo
+from .plan_parsing import JSONObjectExtractor, parse_batch_plan, parse_duration_minutes, parse_plan, plan_from_value
+
+INFERENCE_URL = settings.AI_INFERENCE_URL
+MODEL = settings.AI_MODEL
+SAMPLING_PARAMS = {
+    'temperature': 0.7,
+    'top_p': 0.9,
+    'max_tokens': 2048,
+}
+
+SYSTEM_PROMPT = """You are a productivity expert. Analyze the given tasks and provide a comprehensive plan with:
+1. A detailed planning strategy
+2. Prioritized task list with estimated time and priority levels
+3. Suggested execution order
+4. Any dependencies or recommendations
+
+Format your response as JSON with this structure:
+{
+    "plan": "Your detailed planning advice here",
+    "prioritized_tasks": [
+        {
+            "task": "task description",
+            "priority": "high/medium/low",
+            "estimated_time": "X hours/minutes",
+            "order": 1
+        }
+    ]
+}"""
+
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+
+You will be given several independent, numbered task lists. Plan each list on
+its own, using only its tasks, and respond with JSON of the form
+{"plans": [<plan for list 1>, <plan for list 2>, ...]} where every plan has
+the structure above."""
+
+
+class AIServiceError(Exception):
+    """The inference API could not produce a usable plan."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class PlanCacheStats:
+    """Process-local hit/miss counters for the plan cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+plan_cache_stats = PlanCacheStats()
+plan_flights = AsyncSingleFlight()
+sync_plan_flights = SingleFlight()
+_upstream_slots = threading.BoundedSemaphore(settings.AI_PLAN_MAX_CONCURRENCY)
+_async_upstream_slots = weakref.WeakKeyDictionary()
+_batchers = weakref.WeakKeyDictionary()
+
+
+@registry.register_collector
+def planning_metrics():
+    cache = plan_cache_stats.snapshot()
+    yield (
+        'ai_plan_cache_lookups_total',
+        'counter',
+        'Plan cache lookups by result.',
+        [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])],
+    )
+    flights = [('async', plan_flights.stats.snapshot()), ('sync', sync_plan_flights.stats.snapshot())]
+    yield (
+        'ai_plan_flights_total',
+        'counter',
+        'Plan computations by whether they called upstream or joined one in flight.',
+        [
+            ({'mode': mode, 'role': role}, stats[role])
+            for mode, stats in flights
+            for role in ('executed', 'shared')
+        ],
+    )
+
+
+def build_user_prompt(tasks):
+    return f"""Please analyze and plan these {len(tasks)} tasks:
+
+{chr(10).join(f"- {task}" for task in tasks)}
+
+Provide a realistic, actionable plan that considers task complexity, dependencies, and optimal execution order."""
+
+
+def build_payload(tasks):
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_user_prompt(tasks)}
+        ],
+        **SAMPLING_PARAMS,
+        "model": MODEL
+    }
+
+
+def build_batch_payload(task_lists):
+    lists = '\n\n'.join(
+        f"List {number}:\n" + '\n'.join(f"- {task}" for task in tasks)
+        for number, tasks in enumerate(task_lists, start=1)
+    )
+    return {
+        "messages": [
+            {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Please analyze and plan each of these {len(task_lists)} task lists:\n\n{lists}"}
+        ],
+        **SAMPLING_PARAMS,
+        "model": MODEL
+    }
+
+
+def plan_cache_key(tasks):
+    """
+    Content address of a plan: the normalized task list plus everything that
+    changes the completion (model and sampling params).
+    """
+    material = json.dumps(
+        {'tasks': tasks, 'model': MODEL, 'params': SAMPLING_PARAMS},
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return 'ai-plan:' + hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def inference_headers():
+    headers = {'Content-Type': 'application/json'}
+    # httpx rejects the bare "Bearer " header an unset token would produce
+    if settings.GITHUB_TOKEN:
+        headers['Authorization'] = f'Bearer {settings.GITHUB_TOKEN}'
+    return headers
+
+
+def completion_content(response):
+    if response.status_code != 200:
+        raise AIServiceError(
+            f'AI service error: {response.status_code} - {response.text}',
+            503
+        )
+
+    ai_response = response.json()
+    return ai_response.get('choices', [{}])[0].get('message', {}).get('content', '')
+
+
+def parse_completion(response, tasks):
+    """
+    Turns an inference API response into (plan, parsed).
+    """
+    return parse_plan(completion_content(response), tasks)
+
+
+def get_async_upstream_slots():
+    # asyncio primitives belong to one event loop
+    loop = asyncio.get_running_loop()
+    slots = _async_upstream_slots.get(loop)
+    if slots is None:
+        slots = _async_upstream_slots[loop] = asyncio.Semaphore(settings.AI_PLAN_MAX_CONCURRENCY)
+    return slots
+
+
+def get_plan_batcher():
+    if settings.AI_PLAN_BATCH_WINDOW <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = MicroBatcher(
+            arequest_plans,
+            settings.AI_PLAN_BATCH_WINDOW,
+            settings.AI_PLAN_BATCH_MAX_PLANS
+        )
+    return batcher
+
+
+def request_plan(tasks):
+    """
+    Calls the GitHub AI inference API and returns (plan, parsed). At most
+    AI_PLAN_MAX_CONCURRENCY calls per process are in flight.
+    """
+    with _upstream_slots:
+        response = upstream.request(
+            'POST',
+            INFERENCE_URL,
+            headers=inference_headers(),
+            json=build_payload(tasks)
+        )
+    return parse_completion(response, tasks)
+
+
+async def arequest_plan(tasks):
+    """
+    Async request_plan over the shared pooled client.
+    """
+    async with get_async_upstream_slots():
+        response = await upstream.arequest(
+            'POST',
+            INFERENCE_URL,
+            headers=inference_headers(),
+            json=build_payload(tasks)
+        )
+    return parse_completion(response, tasks)
+
+
+async def arequest_plans(task_lists):
+    """
+    Plans several task lists with one completion; returns a (plan, parsed)
+    pair per list.
+    """
+    if len(task_lists) == 1:
+        return [await arequest_plan(task_lists[0])]
+    async with get_async_upstream_slots():
+        response = await upstream.arequest(
+            'POST',
+            INFERENCE_URL,
+            headers=inference_headers(),
+            json=build_batch_payload(task_lists)
+        )
+    return parse_batch_plan(completion_content(response), task_lists)
+
+
+async def astream_plan(tasks):
+    """
+    Streams a plan: yields ('delta', text) for each piece of the completion
+    as it arrives, then ('plan', validated plan). A cached plan is yielded
+    straight away without deltas.
+    """
+    cache = caches[settings.AI_PLAN_CACHE]
+    key = plan_cache_key(tasks)
+
+    cached = await cache.aget(key)
+    plan_cache_stats.record(cached is not None)
+    if cached is not None:
+        yield 'plan', cached
+        return
+
+    parts = []
+    # Finds the plan object while the completion is still streaming
+    extractor = JSONObjectExtractor()
+    async with get_async_upstream_slots():
+        async with upstream.astream(
+            'POST',
+            INFERENCE_URL,
+            headers=inference_headers(),
+            json={**build_payload(tasks), 'stream': True}
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise AIServiceError(
+                    f'AI service error: {response.status_code} - {response.text}',
+                    503
+                )
+            async for text in iter_completion_deltas(response):
+                parts.append(text)
+                extractor.feed(text)
+                yield 'delta', text
+
+    data, parsed = plan_from_value(extractor.value, ''.join(parts), tasks)
+    if parsed:
+        await cache.aset(key, data)
+    yield 'plan', data
+
+
+async def iter_completion_deltas(response):
+    """
+    Content pieces of a streamed chat completion (`data: {...}` server-sent
+    events ending with `data: [DONE]`).
+    """
+    async for line in response.aiter_lines():
+        if not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            break
+        choices = json.loads(data).get('choices') or [{}]
+        text = (choices[0].get('delta') or {}).get('content')
+        if text:
+            yield text
+
+
+def plan_error(exc):
+    """
+    Maps an exception raised while planning to an (error message, HTTP status) pair.
+    """
+    if isinstance(exc, AIServiceError):
+        return exc.message, exc.status_code
+    if isinstance(exc, httpx.HTTPError):
+        return f'Failed to connect to AI service: {str(exc)}', 503
+    return f'AI planning failed: {str(exc)}', 500
+
+
+def todos_from_plan(plan, user_id):
+    """
+    Unsaved todos for a plan's prioritized tasks, in plan order, carrying
+    its priority, order and (when it can be read) estimate in minutes.
+    """
+    max_length = Todo._meta.get_field('title').max_length
+    return [
+        Todo(
+            user_id=user_id,
+            title=item['task'][:max_length],
+            priority=item['priority'],
+            plan_order=item['order'],
+            estimated_minutes=parse_duration_minutes(item['estimated_time']),
+        )
+        for item in sorted(plan['prioritized_tasks'], key=lambda item: item['order'])
+    ]
+
+
+def get_plan(tasks):
+    """
+    Returns the validated plan for `tasks`, served from the plan cache when
+    the same task list was planned recently.
+    """
+    cache = caches[settings.AI_PLAN_CACHE]
+    key = plan_cache_key(tasks)
+
+    cached = cache.get(key)
+    plan_cache_stats.record(cached is not None)
+    if cached is not None:
+        return cached
+
+    return sync_plan_flights.run(key, lambda: plan_and_cache(tasks, key))
+
+
+def plan_and_cache(tasks, key):
+    data, parsed = request_plan(tasks)
+    # Fallback plans mean the model output was unusable; let the next call retry.
+    if parsed:
+        caches[settings.AI_PLAN_CACHE].set(key, data)
+    return data
+
+
+async def aget_plan(tasks):
+    """
+    Async get_plan; the upstream call does not hold a thread while it waits.
+    Concurrent requests for the same task list share one upstream call, and
+    with AI_PLAN_BATCH_WINDOW set small task lists are batched together.
+    """
+    cache = caches[settings.AI_PLAN_CACHE]
+    key = plan_cache_key(tasks)
+
+    cached = await cache.aget(key)
+    plan_cache_stats.record(cached is not None)
+    if cached is not None:
+        return cached
+
+    return await plan_flights.run(key, lambda: aplan_and_cache(tasks, key))
+
+
+async def aplan_and_cache(tasks, key):
+    batcher = get_plan_batcher()
+    if batcher is not None and len(tasks) <= settings.AI_PLAN_BATCH_MAX_TASKS:
+        data, parsed = await batcher.submit(tasks)
+    else:
+        data, parsed = await arequest_plan(tasks)
+    if parsed:
+        await caches[settings.AI_PLAN_CACHE].aset(key, data)
+    return data
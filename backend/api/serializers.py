@@ -1,22 +1,59 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Todo
+from .events import publish_todo_events
+from .exceptions import TodoConflict
+from .models import PlanningJob, Todo
+from .plan_parsing import INVALID, validate_plan_schema
+from .stats import invalidate_todo_stats
 
 
 class TodoSerializer(serializers.ModelSerializer):
+    # Optional optimistic concurrency token: the updated_at the client last saw
+    expected_updated_at = serializers.DateTimeField(write_only=True, required=False)
+    
     class Meta:
         model = Todo
-        fields = ['id', 'title', 'description', 'priority', 'status', 'due_date', 'created_at', 'updated_at']
+        fields = [
+            'id', 'title', 'description', 'priority', 'status', 'due_date', 'plan_order', 'estimated_minutes',
+            'created_at', 'updated_at', 'expected_updated_at'
+        ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
+        validated_data.pop('expected_updated_at', None)
+        validated_data['user_id'] = self.context['request'].user.id
+        instance = super().create(validated_data)
+        invalidate_todo_stats(instance.user_id)
+        publish_todo_events(instance.user_id, [('created', self.to_representation(instance))])
+        return instance
     
     def update(self, instance, validated_data):
-        # For updates, only update the fields that are provided
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        expected_updated_at = validated_data.pop('expected_updated_at', None)
+        
+        # Only write the columns whose values actually changed
+        changed = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        if not changed:
+            # Nothing to write, but a stale token is still a conflict
+            if expected_updated_at is not None and expected_updated_at != instance.updated_at:
+                raise TodoConflict()
+            return instance
+        
+        for attr in changed:
+            setattr(instance, attr, validated_data[attr])
+        instance.updated_at = timezone.now()
+        update_fields = changed + ['updated_at']
+        
+        if expected_updated_at is None:
+            instance.save(update_fields=update_fields)
+        else:
+            # Conditional UPDATE ... WHERE updated_at = ? so concurrent edits are not lost
+            rows = Todo.objects.filter(pk=instance.pk, updated_at=expected_updated_at).update(
+                **{field: getattr(instance, field) for field in update_fields}
+            )
+            if not rows:
+                raise TodoConflict()
+        invalidate_todo_stats(instance.user_id)
+        publish_todo_events(instance.user_id, [('updated', self.to_representation(instance))])
         return instance
     
     def validate_title(self, value):
@@ -29,7 +66,36 @@ class TodoSerializer(serializers.ModelSerializer):
 class TodoListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Todo
-        fields = ['id', 'title', 'description', 'priority', 'status', 'due_date', 'created_at']
+        fields = ['id', 'title', 'description', 'priority', 'status', 'due_date', 'plan_order', 'estimated_minutes', 'created_at']
+
+
+class TodoBulkSerializer(serializers.Serializer):
+    create = serializers.ListField(child=serializers.DictField(), required=False, max_length=500)
+    update = serializers.ListField(child=serializers.DictField(), required=False, max_length=500)
+    delete = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=500
+    )
+    
+    def validate_delete(self, value):
+        return list(dict.fromkeys(value))
+    
+    def validate_update(self, value):
+        ids = [item.get('id') for item in value]
+        if any(not isinstance(todo_id, int) for todo_id in ids):
+            raise serializers.ValidationError("Every update needs an integer 'id'.")
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError("Each todo may only be updated once per request.")
+        return value
+    
+    def validate(self, attrs):
+        if not any(attrs.get(key) for key in ('create', 'update', 'delete')):
+            raise serializers.ValidationError("At least one create, update or delete operation is required.")
+        overlap = {item['id'] for item in attrs.get('update', [])} & set(attrs.get('delete', []))
+        if overlap:
+            raise serializers.ValidationError(f"Todos cannot be updated and deleted together: {sorted(overlap)}")
+        return attrs
 
 
 class AIPlanningSerializer(serializers.Serializer):
@@ -45,6 +111,25 @@ class AIPlanningSerializer(serializers.Serializer):
         return [task.strip() for task in value if task.strip()]
 
 
-class AIPlanningResponseSerializer(serializers.Serializer):
+class AIPlanApplySerializer(serializers.Serializer):
+    """
+    A plan as returned by the planning endpoints, checked against the same
+    schema as model output before its tasks become todos.
+    """
     plan = serializers.CharField()
-    prioritized_tasks = serializers.ListField(child=serializers.DictField()) 
\ No newline at end of file
+    prioritized_tasks = serializers.ListField(child=serializers.DictField(), min_length=1, max_length=20)
+    
+    def validate(self, attrs):
+        plan = validate_plan_schema(attrs)
+        if plan is INVALID:
+            raise serializers.ValidationError({
+                'prioritized_tasks': "Every task needs a task and a positive order."
+            })
+        return plan
+
+
+class PlanningJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlanningJob
+        fields = ['id', 'status', 'tasks', 'result', 'error', 'error_status', 'created_at', 'updated_at']
+        read_only_fields = fields
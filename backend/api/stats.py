@@ -0,0 +1,58 @@
+"""
+Per-user todo statistics for /api/todos/stats/.
+
+The counts come from one aggregate query with a filtered Count per bucket
+and are cached per user in TODO_STATS_CACHE. Every write path calls
+`invalidate_todo_stats`. `overdue` also changes as time passes, so an entry
+never outlives the next due date of an open todo.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from .models import Todo
+
+
+def stats_key(user_id):
+    return f'todo-stats:{user_id}'
+
+
+def invalidate_todo_stats(user_id):
+    cache = caches[settings.TODO_STATS_CACHE]
+    transaction.on_commit(lambda: cache.delete(stats_key(user_id)))
+
+
+def compute_todo_stats(user_id, now):
+    open_todos = ~Q(status='completed')
+    aggregates = {'total': Count('id')}
+    for value, _ in Todo.STATUS_CHOICES:
+        aggregates[f'status_{value}'] = Count('id', filter=Q(status=value))
+    for value, _ in Todo.PRIORITY_CHOICES:
+        aggregates[f'priority_{value}'] = Count('id', filter=Q(priority=value))
+    aggregates['overdue'] = Count('id', filter=open_todos & Q(due_date__lt=now))
+    aggregates['next_due'] = Min('due_date', filter=open_todos & Q(due_date__gte=now))
+    row = Todo.objects.filter(user_id=user_id).aggregate(**aggregates)
+    
+    stats = {
+        'total': row['total'],
+        'by_status': {value: row[f'status_{value}'] for value, _ in Todo.STATUS_CHOICES},
+        'by_priority': {value: row[f'priority_{value}'] for value, _ in Todo.PRIORITY_CHOICES},
+        'overdue': row['overdue'],
+    }
+    return stats, row['next_due']
+
+
+def get_todo_stats(user_id):
+    cache = caches[settings.TODO_STATS_CACHE]
+    key = stats_key(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        now = timezone.now()
+        stats, next_due = compute_todo_stats(user_id, now)
+        timeout = settings.TODO_STATS_CACHE_TTL
+        if next_due is not None:
+            # The overdue count goes up once the next open todo falls due
+            timeout = min(timeout, max(int((next_due - now).total_seconds()) + 1, 1))
+        cache.set(key, stats, timeout)
+    return stats
@@ -0,0 +1,500 @@
+import json
+import re
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from aitodo import upstream
+from . import changes
+from .plan_parsing import FALLBACK_TEXT, UNKNOWN_ESTIMATE, JSONObjectExtractor, parse_batch_plan, parse_plan
+from .models import PlanningJob, Todo
+
+SET_COLUMN_RE = re.compile(r'"(\w+)" = ')
+
+
+def updates(queries):
+    """The UPDATE statements among captured queries."""
+    return [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+
+
+def set_columns(sql):
+    """Columns assigned in an UPDATE's SET clause."""
+    set_clause = sql.split(' SET ', 1)[1].split(' WHERE ', 1)[0]
+    return set(SET_COLUMN_RE.findall(set_clause))
+
+
+# No planning job sweeper thread next to the test database
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class TodoUpdateTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester', email='tester@example.com')
+        self.client.force_authenticate(self.user)
+        self.todo = Todo.objects.create(user=self.user, title='Write tests', description='Unchanged')
+        self.url = f'/api/todos/{self.todo.pk}/'
+
+    def test_patch_writes_only_changed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {'status': 'completed'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statements = updates(queries)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(set_columns(statements[0]), {'status', 'updated_at'})
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.status, 'completed')
+
+    def test_noop_patch_issues_no_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                self.url, {'title': 'Write tests', 'status': self.todo.status}, format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(updates(queries), [])
+
+    def test_stale_expected_updated_at_conflicts(self):
+        stale = self.todo.updated_at
+        self.client.patch(self.url, {'title': 'Edited elsewhere'}, format='json')
+
+        response = self.client.patch(
+            self.url, {'status': 'completed', 'expected_updated_at': stale.isoformat()}, format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.status, 'pending')
+
+    def test_stale_expected_updated_at_conflicts_without_changes(self):
+        stale = self.todo.updated_at
+        self.client.patch(self.url, {'title': 'Edited elsewhere'}, format='json')
+
+        response = self.client.patch(
+            self.url, {'title': 'Edited elsewhere', 'expected_updated_at': stale.isoformat()}, format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_current_expected_updated_at_updates(self):
+        response = self.client.patch(
+            self.url,
+            {'status': 'completed', 'expected_updated_at': self.todo.updated_at.isoformat()},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.status, 'completed')
+
+    def test_bulk_update_with_stale_expected_updated_at_changes_nothing(self):
+        stale = self.todo.updated_at
+        self.client.patch(self.url, {'title': 'Edited elsewhere'}, format='json')
+
+        response = self.client.post('/api/todos/bulk/', {
+            'create': [{'title': 'New'}],
+            'update': [{'id': self.todo.pk, 'status': 'completed', 'expected_updated_at': stale.isoformat()}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expected_updated_at', response.json()['update'][0])
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.status, 'pending')
+        self.assertFalse(Todo.objects.filter(title='New').exists())
+
+    def test_bulk_update_rechecks_expected_updated_at_in_transaction(self):
+        def edit_then_atomic():
+            # Another request saves the todo after validation, before the write
+            Todo.objects.filter(pk=self.todo.pk).update(title='Edited concurrently', updated_at=timezone.now())
+            return transaction.atomic()
+
+        with mock.patch.object(changes, 'transaction', SimpleNamespace(atomic=edit_then_atomic)):
+            response = self.client.post('/api/todos/bulk/', {
+                'update': [{
+                    'id': self.todo.pk,
+                    'status': 'completed',
+                    'expected_updated_at': self.todo.updated_at.isoformat(),
+                }],
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expected_updated_at', response.json()['update'][0])
+        self.todo.refresh_from_db()
+        self.assertEqual((self.todo.title, self.todo.status), ('Edited concurrently', 'pending'))
+
+
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class BulkTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester', email='tester@example.com')
+        self.client.force_authenticate(self.user)
+        self.todo = Todo.objects.create(user=self.user, title='Keep')
+        self.doomed = Todo.objects.create(user=self.user, title='Delete me')
+
+    def test_create_update_and_delete_in_one_request(self):
+        response = self.client.post('/api/todos/bulk/', {
+            'create': [{'title': 'New', 'priority': 'high'}],
+            'update': [{'id': self.todo.pk, 'status': 'completed'}],
+            'delete': [self.doomed.pk],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([todo['title'] for todo in response.json()['created']], ['New'])
+        self.assertEqual(response.json()['updated'][0]['status'], 'completed')
+        self.assertEqual(response.json()['deleted'], [self.doomed.pk])
+        self.assertEqual(
+            set(Todo.objects.values_list('title', 'status')),
+            {('Keep', 'completed'), ('New', 'pending')}
+        )
+
+    def test_missing_delete_id_applies_nothing(self):
+        other = Todo.objects.create(
+            user=get_user_model().objects.create(username='other', email='other@example.com'),
+            title='Not yours'
+        )
+
+        response = self.client.post('/api/todos/bulk/', {
+            'create': [{'title': 'New'}],
+            'update': [{'id': self.todo.pk, 'status': 'completed'}],
+            'delete': [self.doomed.pk, other.pk],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(other.pk), response.json()['delete'][0])
+        self.assertEqual(Todo.objects.count(), 3)
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.status, 'pending')
+
+    def test_invalid_create_reports_its_index(self):
+        response = self.client.post('/api/todos/bulk/', {
+            'create': [{'title': 'Fine'}, {'title': 'Bad', 'priority': 'urgent'}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['create'][0], {})
+        self.assertIn('priority', response.json()['create'][1])
+        self.assertFalse(Todo.objects.filter(title='Fine').exists())
+
+
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester', email='tester@example.com')
+        self.client.force_authenticate(self.user)
+        self.todo = Todo.objects.create(user=self.user, title='Cache me')
+        self.url = f'/api/todos/{self.todo.pk}/'
+
+    def test_list_matching_etag_is_not_modified(self):
+        etag = self.client.get('/api/todos/')['ETag']
+
+        response = self.client.get('/api/todos/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_list_etag_changes_after_an_update(self):
+        etag = self.client.get('/api/todos/')['ETag']
+        self.client.patch(self.url, {'status': 'completed'}, format='json')
+
+        response = self.client.get('/api/todos/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['status'], 'completed')
+
+    def test_list_etag_depends_on_the_query(self):
+        etag = self.client.get('/api/todos/')['ETag']
+
+        response = self.client.get('/api/todos/', {'status': 'pending'}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_detail_etag_changes_after_an_update(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(self.url, {'title': 'Changed'}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['title'], 'Changed')
+
+
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class TransferTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester', email='tester@example.com')
+        self.client.force_authenticate(self.user)
+
+    def import_body(self, body, content_type='application/x-ndjson'):
+        return self.client.generic('POST', '/api/todos/import/', body, content_type=content_type)
+
+    def test_ndjson_export_imports_back(self):
+        Todo.objects.create(user=self.user, title='Report', description='Q3 "numbers"', priority='high', plan_order=1)
+        Todo.objects.create(user=self.user, title='Dentist', status='completed', estimated_minutes=30)
+
+        export = self.client.get('/api/todos/export/')
+        body = b''.join(export)
+        Todo.objects.all().delete()
+        response = self.import_body(body)
+
+        self.assertEqual(export['Content-Disposition'], 'attachment; filename="todos.ndjson"')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json(), {'created': 2})
+        self.assertEqual(
+            list(Todo.objects.order_by('title').values_list(
+                'title', 'description', 'priority', 'status', 'plan_order', 'estimated_minutes'
+            )),
+            [('Dentist', '', 'medium', 'completed', None, 30), ('Report', 'Q3 "numbers"', 'high', 'pending', 1, None)]
+        )
+
+    def test_csv_export_imports_back(self):
+        Todo.objects.create(user=self.user, title='Report, final', priority='low')
+
+        body = b''.join(self.client.get('/api/todos/export/', {'format': 'csv'}))
+        Todo.objects.all().delete()
+        response = self.import_body(body, content_type='text/csv')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(list(Todo.objects.values_list('title', 'priority')), [('Report, final', 'low')])
+
+    def test_malformed_lines_are_reported_and_nothing_is_imported(self):
+        body = b'{"title": "Fine"}\n{"title": \n\n{"title": "Bad", "priority": "urgent"}\n'
+
+        response = self.import_body(body)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()['errors']
+        self.assertEqual([error['line'] for error in errors], [2, 4])
+        self.assertIn('priority', errors[1]['errors'])
+        self.assertFalse(Todo.objects.exists())
+
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class PlanApplyTests(APITestCase):
+    PLAN = {
+        'plan': 'Report first, then the dentist.',
+        'prioritized_tasks': [
+            {'task': 'Book dentist', 'priority': 'low', 'estimated_time': '10 minutes', 'order': 2},
+            {'task': 'Write report', 'priority': 'High', 'estimated_time': '1h30m', 'order': 1},
+        ],
+    }
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester', email='tester@example.com')
+        self.client.force_authenticate(self.user)
+
+    def test_apply_creates_the_plan_as_shown_without_planning_again(self):
+        with mock.patch('api.planning.request_plan', side_effect=AssertionError('planned again')):
+            response = self.client.post('/api/todos/plan/apply/', self.PLAN, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [(todo['title'], todo['priority'], todo['plan_order'], todo['estimated_minutes'])
+             for todo in response.json()['todos']],
+            [('Write report', 'high', 1, 90), ('Book dentist', 'low', 2, 10)]
+        )
+        self.assertEqual(Todo.objects.filter(user=self.user).count(), 2)
+
+    def test_apply_rejects_out_of_range_order(self):
+        plan = {**self.PLAN, 'prioritized_tasks': [{**self.PLAN['prioritized_tasks'][0], 'order': -1}]}
+
+        response = self.client.post('/api/todos/plan/apply/', plan, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Todo.objects.exists())
+
+
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class PlanningJobTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester', email='tester@example.com')
+        self.client.force_authenticate(self.user)
+
+    def test_failed_job_reports_the_upstream_status(self):
+        job = PlanningJob.objects.create(
+            user=self.user, tasks=['a'], status='failed', error='AI service unavailable', error_status=503
+        )
+
+        response = self.client.get(f'/api/todos/plan/jobs/{job.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.json()['status'], response.json()['error_status']), ('failed', 503))
+
+
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class ChangesTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester', email='tester@example.com')
+        self.client.force_authenticate(self.user)
+
+    def changes(self, since):
+        return self.client.get('/api/todos/changes/', {'since': since}).json()
+
+    def test_rows_committed_late_within_the_write_bound_are_not_missed(self):
+        cursor = self.changes('')['cursor']
+        # Written (updated_at) well before the cursor, committed after it
+        written_at = changes.decode_cursor(cursor) - timedelta(seconds=20)
+        todo = Todo.objects.create(user=self.user, title='Slow import')
+        Todo.objects.filter(pk=todo.pk).update(updated_at=written_at)
+
+        self.assertIn(todo.pk, [row['id'] for row in self.changes(cursor)['changed']])
+
+    def test_bulk_delete_of_a_repeated_id_records_it_once(self):
+        todo = Todo.objects.create(user=self.user, title='Delete me')
+        cursor = self.changes('')['cursor']
+
+        response = self.client.post('/api/todos/bulk/', {'delete': [todo.pk, todo.pk]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['deleted'], [todo.pk])
+        self.assertEqual(self.changes(cursor)['deleted'], [todo.pk])
+
+    @override_settings(TODO_WRITE_MAX_SECONDS=-1)
+    def test_writes_over_the_bound_are_rolled_back(self):
+        response = self.client.post('/api/todos/bulk/', {'create': [{'title': 'Too slow'}]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(Todo.objects.exists())
+
+
+STREAMED_PLAN = {
+    'plan': 'Start with the report: {it is due} "today".',
+    'prioritized_tasks': [
+        {'task': 'Write report', 'priority': 'high', 'estimated_time': '1 hour', 'order': 1},
+        {'task': 'Book dentist', 'priority': 'low', 'estimated_time': '10 minutes', 'order': 2},
+    ],
+}
+
+
+def completion_events(text, pieces):
+    """A streamed chat completion of `text` in `pieces` deltas, as SSE bytes."""
+    size = -(-len(text) // pieces)
+    events = [
+        'data: ' + json.dumps({'choices': [{'delta': {'content': text[i:i + size]}}]}) + '\n\n'
+        for i in range(0, len(text), size)
+    ]
+    return ''.join(events + ['data: [DONE]\n\n']).encode()
+
+
+def sse_events(response):
+    """(event, data) pairs from a server-sent events response."""
+    body = b''.join(response).decode()
+    return [
+        (re.search(r'^event: (.*)$', block, re.M).group(1), json.loads(re.search(r'^data: (.*)$', block, re.M).group(1)))
+        for block in body.split('\n\n') if block.strip()
+    ]
+
+
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class PlanStreamTests(APITestCase):
+    TASKS = ['Write report', 'Book dentist']
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='tester', email='tester@example.com')
+        self.client.force_authenticate(self.user)
+        caches[settings.AI_PLAN_CACHE].clear()
+
+    def stream(self, upstream_response):
+        transport = httpx.MockTransport(lambda request: upstream_response)
+        options = {**upstream.client_options(), 'transport': transport}
+        with mock.patch.multiple(upstream, client_options=lambda: options, _client=None, _hosts={}):
+            return sse_events(self.client.post('/api/todos/plan/stream/', {'tasks': self.TASKS}, format='json'))
+
+    def test_split_chunks_stream_as_deltas_then_the_parsed_plan(self):
+        text = 'Here is your plan:\n```json\n' + json.dumps(STREAMED_PLAN) + '\n```'
+        body = completion_events(text, pieces=25)
+
+        async def chunks():
+            # Network chunks that split events, escapes and strings anywhere
+            for i in range(0, len(body), 7):
+                yield body[i:i + 7]
+
+        events = self.stream(httpx.Response(200, content=chunks()))
+
+        deltas = [data['text'] for kind, data in events if kind == 'delta']
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual(''.join(deltas), text)
+        self.assertEqual(events[-1], ('plan', STREAMED_PLAN))
+
+    def test_upstream_error_becomes_an_error_event(self):
+        with override_settings(UPSTREAM_MAX_RETRIES=0):
+            events = self.stream(httpx.Response(500, text='overloaded'))
+
+        self.assertEqual([kind for kind, _ in events], ['error'])
+        self.assertEqual(events[0][1]['status'], 503)
+
+
+class PlanParsingTests(SimpleTestCase):
+    VALUE = {'note': 'a "quoted" {brace} and a \\ backslash', 'nested': {'list': [1, {'x': '}'}]}}
+
+    def test_object_is_found_however_the_text_is_split(self):
+        text = 'Sure! {not json} here it is: ' + json.dumps(self.VALUE) + ' {"later": true}'
+        for size in (1, 2, 3, 5, 8):
+            extractor = JSONObjectExtractor()
+            results = [extractor.feed(text[i:i + size]) for i in range(0, len(text), size)]
+            with self.subTest(size=size):
+                self.assertEqual(next(value for value in results if value is not None), self.VALUE)
+
+    def test_split_after_a_backslash_waits_for_the_escaped_character(self):
+        extractor = JSONObjectExtractor()
+
+        self.assertIsNone(extractor.feed('{"a": "x\\'))
+        self.assertIsNone(extractor.feed('"}'))
+        self.assertEqual(extractor.feed('"}'), {'a': 'x"}'})
+
+    def test_incomplete_object_gives_nothing(self):
+        self.assertIsNone(JSONObjectExtractor().feed('{"plan": "cut off'))
+
+    def test_unusable_completion_falls_back_to_task_order(self):
+        plan, parsed = parse_plan('I cannot help with that.', ['a', 'b'])
+
+        self.assertFalse(parsed)
+        self.assertEqual([(task['task'], task['order']) for task in plan['prioritized_tasks']], [('a', 1), ('b', 2)])
+
+    def test_bad_priority_or_estimate_is_repaired_not_fallen_back(self):
+        content = json.dumps({'plan': 'Do it', 'prioritized_tasks': [
+            {'task': 'a', 'priority': 'urgent', 'estimated_time': 45, 'order': 1},
+            {'task': 'b', 'priority': 'low', 'order': 2},
+            {'task': 'c', 'priority': 'low', 'estimated_time': {'hours': 1}, 'order': 3},
+        ]})
+
+        plan, parsed = parse_plan(content, ['a', 'b', 'c'])
+
+        self.assertTrue(parsed)
+        self.assertEqual(
+            [(task['priority'], task['estimated_time']) for task in plan['prioritized_tasks']],
+            [('medium', '45 minutes'), ('low', UNKNOWN_ESTIMATE), ('low', UNKNOWN_ESTIMATE)]
+        )
+
+    def test_task_without_text_still_falls_back(self):
+        content = json.dumps({'plan': 'Do it', 'prioritized_tasks': [
+            {'task': 'a', 'priority': 'high', 'estimated_time': '1h', 'order': 1}, {'priority': 'low', 'order': 2},
+        ]})
+
+        self.assertFalse(parse_plan(content, ['a', 'b'])[1])
+
+    def test_batch_plan_is_split_per_task_list(self):
+        good = {'plan': 'Do it', 'prioritized_tasks': [
+            {'task': 'a', 'priority': 'HIGH', 'estimated_time': '5 minutes', 'order': 1}
+        ]}
+        content = json.dumps({'plans': [good, {'plan': 'missing tasks'}]})
+
+        (first, first_parsed), (second, second_parsed), (third, third_parsed) = parse_batch_plan(
+            content, [['a'], ['b'], ['c']]
+        )
+
+        self.assertTrue(first_parsed)
+        self.assertEqual(first['prioritized_tasks'][0]['priority'], 'high')
+        self.assertFalse(second_parsed or third_parsed)
+        self.assertEqual(second['plan'], FALLBACK_TEXT)
+        self.assertEqual(third['prioritized_tasks'][0]['task'], 'c')
@@ -0,0 +1,9 @@
+from rest_framework.throttling import UserRateThrottle
+
+
+class PlanRateThrottle(UserRateThrottle):
+    """
+    Per-user limit on AI plan requests (DEFAULT_THROTTLE_RATES['ai_plan']),
+    which each may cost an upstream completion.
+    """
+    scope = 'ai_plan'
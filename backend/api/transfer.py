@@ -0,0 +1,132 @@
+"""
+Streaming export and import of a user's todos as NDJSON or CSV.
+
+Exports walk the queryset with `aiterator()` (a server-side cursor on
+Postgres) and yield a few hundred rows per chunk. The generator is async
+because under ASGI Django would otherwise collect a sync iterator into a
+list first. Imports read the request body line by line, validate each row
+with TodoSerializer and insert with batched bulk_create, so memory stays
+flat either way.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+import orjson
+from .models import Todo
+from .serializers import TodoSerializer
+
+EXPORT_FIELDS = [
+    'id', 'title', 'description', 'priority', 'status', 'due_date', 'plan_order', 'estimated_minutes',
+    'created_at', 'updated_at'
+]
+EXPORT_CHUNK_SIZE = 2000
+# Rows per yielded chunk of the response body
+EXPORT_ROWS_PER_WRITE = 500
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ERRORS = 100
+# Columns where an empty CSV cell means "not given" rather than ""
+CSV_OPTIONAL_FIELDS = ('priority', 'status', 'due_date', 'plan_order', 'estimated_minutes')
+
+
+class TodoImportError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+async def stream_ndjson(queryset):
+    lines = []
+    async for row in queryset.values(*EXPORT_FIELDS).aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        lines.append(orjson.dumps(row, option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE))
+        if len(lines) >= EXPORT_ROWS_PER_WRITE:
+            yield b''.join(lines)
+            lines = []
+    if lines:
+        yield b''.join(lines)
+
+
+async def stream_csv(queryset):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    rows = 0
+    # values() rather than values_list(): the latter's aiterator() runs the
+    # query on the event loop in Django 4.2
+    async for row in queryset.values(*EXPORT_FIELDS).aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        writer.writerow([format_csv_value(row[field]) for field in EXPORT_FIELDS])
+        rows += 1
+        if rows % EXPORT_ROWS_PER_WRITE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def format_csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        # Same representation as the JSON API
+        return value.isoformat().replace('+00:00', 'Z')
+    return value
+
+
+def read_ndjson(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def read_csv(stream):
+    lines = (line.decode('utf-8') for line in stream)
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, {
+            key: value for key, value in row.items()
+            if key is not None and not (key in CSV_OPTIONAL_FIELDS and value == '')
+        }
+
+
+def import_todos(rows, user_id, context):
+    """
+    Validates and inserts (line number, row) pairs in batches. Returns the
+    number of todos created; raises TodoImportError with the first
+    MAX_IMPORT_ERRORS problems, in which case the caller's transaction
+    should be rolled back.
+    """
+    batch = []
+    errors = []
+    created = 0
+    for line_number, row in rows:
+        if row is None:
+            errors.append({'line': line_number, 'errors': ['Not a JSON object.']})
+        else:
+            serializer = TodoSerializer(data=row, context=context)
+            if not serializer.is_valid():
+                errors.append({'line': line_number, 'errors': serializer.errors})
+            elif not errors:
+                # Once anything failed, only keep collecting errors
+                data = serializer.validated_data
+                data.pop('expected_updated_at', None)
+                batch.append(Todo(user_id=user_id, **data))
+        if len(errors) >= MAX_IMPORT_ERRORS:
+            break
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            Todo.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+
+    if errors:
+        raise TodoImportError(errors)
+    if batch:
+        Todo.objects.bulk_create(batch)
+        created += len(batch)
+    return created
@@ -1,11 +1,13 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import TodoViewSet
+from .views import TodoViewSet, events, plan, plan_stream
 
 router = DefaultRouter()
 router.register(r'', TodoViewSet, basename='todo')
 
 urlpatterns = [
+    path('plan/', plan, name='todo-plan'),
+    path('plan/stream/', plan_stream, name='todo-plan-stream'),
+    path('events/', events, name='todo-events'),
     path('', include(router.urls)),
-    path('plan/', TodoViewSet.as_view({'post': 'plan'}), name='todo-plan'),
 ] 
\ No newline at end of file
@@ -1,154 +1,404 @@
-import requests
-import json
+import logging
+
+from asgiref.sync import sync_to_async
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.permissions import IsAuthenticated
-from django.conf import settings
-from .models import Todo
+from rest_framework.settings import api_settings
+from django.db import DatabaseError, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from aitodo.async_views import async_api_view
+from aitodo.renderers import CSVRenderer, NDJSONRenderer
+from authentication.backends import QueryParamJWTAuthentication
+from .changes import InvalidCursor, decode_cursor, get_changes, record_deletions, todo_write_transaction
+from .events import event_stream, format_event, publish_todo_events
+from .etags import not_modified, set_validators, todo_etag, todo_list_etag
+from .exceptions import TodoConflict
+from .filters import TodoFilterBackend, TodoOrderingFilter
+from .jobs import enqueue_planning_job
+from .models import PlanningJob, Todo
+from .pagination import TodoCursorPagination
+from .planning import aget_plan, astream_plan, plan_error, todos_from_plan
+from .stats import get_todo_stats, invalidate_todo_stats
+from .throttles import PlanRateThrottle
 from .serializers import (
     TodoSerializer, 
     TodoListSerializer, 
+    TodoBulkSerializer,
+    AIPlanApplySerializer,
     AIPlanningSerializer,
-    AIPlanningResponseSerializer
+    PlanningJobSerializer
 )
+from .transfer import TodoImportError, import_todos, read_csv, read_ndjson, stream_csv, stream_ndjson
+
+logger = logging.getLogger(__name__)
 
 
 class TodoViewSet(viewsets.ModelViewSet):
     serializer_class = TodoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TodoCursorPagination
+    filter_backends = [TodoFilterBackend, TodoOrderingFilter]
+    ordering_fields = ['created_at', 'updated_at', 'due_date', 'priority']
+    ordering = ['-created_at']
     
     def get_queryset(self):
-        return Todo.objects.filter(user=self.request.user)
+        # Only the id is needed, which also works for stateless token users
+        return Todo.objects.filter(user_id=self.request.user.id)
     
     def get_serializer_class(self):
         if self.action == 'list':
             return TodoListSerializer
         return TodoSerializer
     
+    def list(self, request, *args, **kwargs):
+        etag = todo_list_etag(request, self.get_queryset())
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        
+        # Rows come straight from .values() and are rendered by ORJSONRenderer;
+        # TodoListSerializer's fields are plain columns, so the output is the same
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = TodoListSerializer.Meta.fields
+        # The page cursor needs the sort keys (updated_at, priority_rank, ...) too
+        sort_keys = [name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str)]
+        extra = [name for name in dict.fromkeys(sort_keys) if name not in fields]
+        page = self.paginate_queryset(queryset.values(*fields, *extra))
+        response = self.get_paginated_response(page)
+        for row in page:
+            for name in extra:
+                del row[name]
+        return set_validators(response, etag)
+    
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = todo_etag(instance)
+        response = not_modified(request, etag, instance.updated_at)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(instance)
+        return set_validators(Response(serializer.data), etag, instance.updated_at)
+    
+    def perform_destroy(self, instance):
+        todo_id = instance.pk
+        with transaction.atomic():
+            record_deletions(self.request.user.id, [todo_id])
+            instance.delete()
+            invalidate_todo_stats(self.request.user.id)
+            publish_todo_events(self.request.user.id, [('deleted', {'id': todo_id})])
+    
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Todos created or updated, and ids of todos deleted, since the `since`
+        cursor returned by a previous call
+        """
+        since = request.query_params.get('since')
+        try:
+            since = decode_cursor(since) if since else None
+        except InvalidCursor:
+            return Response({'error': 'Invalid since cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        changed, deleted, cursor, full = get_changes(self.get_queryset(), request.user.id, since)
+        return Response({
+            'changed': TodoSerializer(changed, many=True).data,
+            'deleted': deleted,
+            'cursor': cursor,
+            'full': full,
+        }, status=status.HTTP_200_OK)
+    
     @action(detail=False, methods=['post'])
-    def plan(self, request):
+    def bulk(self, request):
         """
-        AI Planning endpoint using GitHub AI inference API with DeepSeek model
+        Batched create/update/delete of todos, validated up front and executed
+        in one transaction with bulk_create, bulk_update and a single DELETE
         """
-        serializer = AIPlanningSerializer(data=request.data)
+        serializer = TodoBulkSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        tasks = serializer.validated_data['tasks']
+        operations = serializer.validated_data
+        queryset = self.get_queryset()
+        errors = {}
         
-        try:
-            # Prepare prompt for AI planning
-            system_prompt = """You are a productivity expert. Analyze the given tasks and provide a comprehensive plan with:
-1. A detailed planning strategy
-2. Prioritized task list with estimated time and priority levels
-3. Suggested execution order
-4. Any dependencies or recommendations
-
-Format your response as JSON with this structure:
-{
-    "plan": "Your detailed planning advice here",
-    "prioritized_tasks": [
-        {
-            "task": "task description",
-            "priority": "high/medium/low",
-            "estimated_time": "X hours/minutes",
-            "order": 1
-        }
-    ]
-}"""
-
-            user_prompt = f"""Please analyze and plan these {len(tasks)} tasks:
-
-{chr(10).join(f"- {task}" for task in tasks)}
-
-Provide a realistic, actionable plan that considers task complexity, dependencies, and optimal execution order."""
-
-            # Call GitHub AI inference API
-            headers = {
-                'Authorization': f'Bearer {settings.GITHUB_TOKEN}',
-                'Content-Type': 'application/json',
-            }
-            
-            payload = {
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "max_tokens": 2048,
-                "model": "deepseek/DeepSeek-V3-0324"
-            }
-            
-            response = requests.post(
-                'https://models.github.ai/inference/chat/completions',
-                headers=headers,
-                json=payload,
-                timeout=30
+        create_serializer = TodoSerializer(
+            data=operations.get('create', []),
+            many=True,
+            context=self.get_serializer_context()
+        )
+        if create_serializer.is_valid():
+            for data in create_serializer.validated_data:
+                data.pop('expected_updated_at', None)
+        else:
+            errors['create'] = create_serializer.errors
+        
+        update_items = operations.get('update', [])
+        instances = queryset.in_bulk([item['id'] for item in update_items])
+        update_serializers = []
+        update_errors = []
+        for item in update_items:
+            instance = instances.get(item['id'])
+            if instance is None:
+                update_errors.append({'id': ['Todo not found.']})
+                continue
+            item_serializer = TodoSerializer(instance, data=item, partial=True)
+            if not item_serializer.is_valid():
+                update_errors.append(item_serializer.errors)
+                continue
+            expected_updated_at = item_serializer.validated_data.pop('expected_updated_at', None)
+            if expected_updated_at is not None and expected_updated_at != instance.updated_at:
+                update_errors.append({'expected_updated_at': [TodoConflict.default_detail]})
+                continue
+            update_serializers.append((item_serializer, expected_updated_at))
+            update_errors.append({})
+        if any(update_errors):
+            errors['update'] = update_errors
+        
+        delete_ids = operations.get('delete', [])
+        if delete_ids:
+            existing_ids = set(queryset.filter(id__in=delete_ids).values_list('id', flat=True))
+            missing_ids = [todo_id for todo_id in delete_ids if todo_id not in existing_ids]
+            if missing_ids:
+                errors['delete'] = [f'Todos not found: {missing_ids}']
+        
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        with todo_write_transaction():
+            # Checked again on the rows locked for the rest of the transaction,
+            # which are also the ones written, so no concurrent edit is lost
+            locked = queryset.select_for_update().in_bulk(
+                [item_serializer.instance.pk for item_serializer, _ in update_serializers]
             )
+            update_errors = []
+            for item_serializer, expected_updated_at in update_serializers:
+                instance = locked.get(item_serializer.instance.pk)
+                if instance is None:
+                    update_errors.append({'id': ['Todo not found.']})
+                elif expected_updated_at is not None and expected_updated_at != instance.updated_at:
+                    update_errors.append({'expected_updated_at': [TodoConflict.default_detail]})
+                else:
+                    update_errors.append({})
+            if any(update_errors):
+                return Response({'update': update_errors}, status=status.HTTP_400_BAD_REQUEST)
             
-            if response.status_code != 200:
-                return Response(
-                    {'error': f'AI service error: {response.status_code} - {response.text}'}, 
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
+            created = Todo.objects.bulk_create([
+                Todo(user_id=request.user.id, **data) for data in create_serializer.validated_data
+            ])
             
-            ai_response = response.json()
-            content = ai_response.get('choices', [{}])[0].get('message', {}).get('content', '')
+            updated = []
+            changed_instances = []
+            update_fields = {'updated_at'}
+            now = timezone.now()
+            for item_serializer, _ in update_serializers:
+                instance = locked[item_serializer.instance.pk]
+                updated.append(instance)
+                # Only write the columns whose values actually changed
+                changed = [
+                    attr for attr, value in item_serializer.validated_data.items()
+                    if getattr(instance, attr) != value
+                ]
+                if not changed:
+                    continue
+                for attr in changed:
+                    setattr(instance, attr, item_serializer.validated_data[attr])
+                instance.updated_at = now
+                update_fields.update(changed)
+                changed_instances.append(instance)
+            if changed_instances:
+                Todo.objects.bulk_update(changed_instances, fields=sorted(update_fields))
             
-            # Try to parse JSON from the response
-            try:
-                # Extract JSON from the response (it might be wrapped in markdown)
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    response_data = json.loads(json_match.group())
-                else:
-                    # Fallback: create a structured response from the text
-                    response_data = {
-                        "plan": content,
-                        "prioritized_tasks": [
-                            {
-                                "task": task,
-                                "priority": "high" if i < len(tasks) // 3 else "medium" if i < 2 * len(tasks) // 3 else "low",
-                                "estimated_time": f"{30 + i * 15} minutes",
-                                "order": i + 1
-                            }
-                            for i, task in enumerate(tasks)
-                        ]
-                    }
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create a structured response
-                response_data = {
-                    "plan": content,
-                    "prioritized_tasks": [
-                        {
-                            "task": task,
-                            "priority": "high" if i < len(tasks) // 3 else "medium" if i < 2 * len(tasks) // 3 else "low",
-                            "estimated_time": f"{30 + i * 15} minutes",
-                            "order": i + 1
-                        }
-                        for i, task in enumerate(tasks)
-                    ]
-                }
-            
-            response_serializer = AIPlanningResponseSerializer(data=response_data)
-            if response_serializer.is_valid():
-                return Response(response_serializer.data, status=status.HTTP_200_OK)
-            else:
-                return Response(
-                    {'error': 'Invalid response format from AI service'}, 
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-                
-        except requests.RequestException as e:
+            if delete_ids:
+                record_deletions(request.user.id, delete_ids)
+                queryset.filter(id__in=delete_ids).delete()
+        
+        data = {
+            'created': TodoSerializer(created, many=True).data,
+            'updated': TodoSerializer(updated, many=True).data,
+            'deleted': delete_ids,
+        }
+        invalidate_todo_stats(request.user.id)
+        changed_ids = {instance.pk for instance in changed_instances}
+        publish_todo_events(request.user.id, [
+            *(('created', todo) for todo in data['created']),
+            *(('updated', todo) for todo in data['updated'] if todo['id'] in changed_ids),
+            *(('deleted', {'id': todo_id}) for todo_id in delete_ids),
+        ])
+        return Response(data, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Todo counts by status and priority plus the number of overdue todos
+        """
+        return Response(get_todo_stats(request.user.id), status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        All of the user's todos as NDJSON (default) or CSV, picked with
+        ?format=csv or the Accept header, streamed in chunks
+        """
+        if request.accepted_renderer.format == 'csv':
+            content, extension = stream_csv(self.get_queryset().order_by('id')), 'csv'
+        else:
+            content, extension = stream_ndjson(self.get_queryset().order_by('id')), 'ndjson'
+        response = StreamingHttpResponse(content, content_type=request.accepted_media_type)
+        response['Content-Disposition'] = f'attachment; filename="todos.{extension}"'
+        return response
+    
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def import_todos(self, request):
+        """
+        Creates todos from an NDJSON or (Content-Type: text/csv) CSV body in
+        the export format. All rows are validated like POST /api/todos/;
+        nothing is imported if any row is invalid.
+        """
+        # Read the raw body incrementally instead of through request.data
+        stream = request.stream
+        if stream is None:
+            return Response({'error': 'Request body is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        is_csv = request.content_type.split(';')[0].strip() == 'text/csv'
+        rows = read_csv(stream) if is_csv else read_ndjson(stream)
+        
+        try:
+            with todo_write_transaction():
+                created = import_todos(rows, request.user.id, self.get_serializer_context())
+        except TodoImportError as e:
+            return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({'error': 'Body must be UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if created:
+            invalidate_todo_stats(request.user.id)
+            # Clients reload rather than receiving one event per row
+            publish_todo_events(request.user.id, [('resync', {})])
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'], url_path=r'plan/jobs/(?P<job_id>[0-9a-f-]+)', url_name='plan-job')
+    def plan_job(self, request, job_id=None):
+        """
+        Status and, once finished, result of an asynchronous planning job
+        """
+        job = get_object_or_404(PlanningJob, pk=job_id, user_id=request.user.id)
+        return Response(PlanningJobSerializer(job).data, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'], url_path='plan/apply', url_name='plan-apply')
+    def plan_apply(self, request):
+        """
+        Creates the todos of a plan returned by the planning endpoints, exactly
+        as it was shown, without planning again
+        """
+        serializer = AIPlanApplySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        todos = apply_plan(serializer.validated_data, request.user.id)
+        return Response({'todos': todos}, status=status.HTTP_201_CREATED)
+
+
+@async_api_view(['POST'], throttle_classes=[PlanRateThrottle])
+async def plan(request):
+    """
+    AI Planning endpoint using GitHub AI inference API with DeepSeek model.
+    Async so that waiting on the model does not hold a worker thread.
+    With ?apply=true the plan's tasks are also created as todos.
+    """
+    serializer = AIPlanningSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    tasks = serializer.validated_data['tasks']
+    apply = request.query_params.get('apply') in ('1', 'true')
+    
+    if request.query_params.get('async') in ('1', 'true'):
+        if apply:
             return Response(
-                {'error': f'Failed to connect to AI service: {str(e)}'}, 
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
+                {'error': 'apply is not supported for asynchronous plans'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        except Exception as e:
+        # Job mode: the result is fetched later from the job URL
+        job = await sync_to_async(enqueue_planning_job)(request.user, tasks)
+        data = PlanningJobSerializer(job).data
+        data['url'] = reverse('todo-plan-job', kwargs={'job_id': job.pk}, request=request)
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+    
+    try:
+        data = await aget_plan(tasks)
+    except Exception as e:
+        message, status_code = plan_error(e)
+        return Response({'error': message}, status=status_code)
+    
+    if apply:
+        try:
+            todos = await sync_to_async(apply_plan)(data, request.user.id)
+        except DatabaseError:
+            logger.exception('Could not save planned todos')
             return Response(
-                {'error': f'AI planning failed: {str(e)}'}, 
+                {'error': 'The plan could not be saved as todos'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            ) 
\ No newline at end of file
+            )
+        return Response({**data, 'todos': todos}, status=status.HTTP_201_CREATED)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+def apply_plan(plan, user_id):
+    """
+    Creates the plan's todos with one bulk INSERT and returns them serialized.
+    """
+    with todo_write_transaction():
+        created = Todo.objects.bulk_create(todos_from_plan(plan, user_id))
+        todos = TodoSerializer(created, many=True).data
+        invalidate_todo_stats(user_id)
+        publish_todo_events(user_id, [('created', todo) for todo in todos])
+    return todos
+
+
+@async_api_view(['POST'], throttle_classes=[PlanRateThrottle])
+async def plan_stream(request):
+    """
+    Streaming variant of `plan`: Server-Sent Events with `delta` events
+    carrying the completion text as it is generated, then one `plan` event
+    with the validated plan (or an `error` event).
+    """
+    serializer = AIPlanningSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = StreamingHttpResponse(
+        plan_event_stream(serializer.validated_data['tasks']),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def plan_event_stream(tasks):
+    try:
+        async for kind, data in astream_plan(tasks):
+            yield format_event(kind, {'text': data} if kind == 'delta' else data)
+    except Exception as e:
+        message, status_code = plan_error(e)
+        yield format_event('error', {'error': message, 'status': status_code})
+
+
+@async_api_view(
+    ['GET'],
+    authentication_classes=[*api_settings.DEFAULT_AUTHENTICATION_CLASSES, QueryParamJWTAuthentication]
+)
+async def events(request):
+    """
+    Server-Sent Events stream of the user's todo changes. EventSource cannot
+    send headers, so the access token may also be passed as ?access_token=.
+    """
+    response = StreamingHttpResponse(event_stream(request.user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
\ No newline at end of file
@@ -3,4 +3,10 @@ from django.apps import AppConfig
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'authentication' 
\ No newline at end of file
+    name = 'authentication'
+    
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .backends import invalidate_cached_user
+        post_save.connect(invalidate_cached_user, sender=self.get_model('User'))
+        post_delete.connect(invalidate_cached_user, sender=self.get_model('User'))
\ No newline at end of file
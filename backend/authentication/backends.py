@@ -0,0 +1,108 @@
+"""
+Opt-in stateless JWT authentication (JWT_STATELESS_AUTH=True).
+
+The stock JWTAuthentication loads the user row on every request just to set
+request.user, although the hot todo endpoints only need the user id from the
+signed token. StatelessJWTAuthentication trusts the `user_id` claim instead
+and only hydrates the full user, through a small in-process LRU with a TTL,
+when something asks for more than the id.
+
+Deactivating a user therefore takes effect when their access token expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+
+class UserCache:
+    """
+    Least-recently-used cache of User instances by id, with a time-to-live.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        user = get_user_model().objects.get(pk=user_id)
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+class HydratingTokenUser(TokenUser):
+    """
+    TokenUser whose id/pk come from the token. Any other user attribute loads
+    the real User from `user_cache` on first access.
+    """
+
+    @cached_property
+    def instance(self):
+        return user_cache.get(self.id)
+
+    @cached_property
+    def username(self):
+        return self.instance.username
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.instance, attr)
+
+    def __str__(self):
+        return str(self.instance)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication without a per-request user lookup. Returns
+    SIMPLE_JWT['TOKEN_USER_CLASS'] instances (HydratingTokenUser).
+    """
+
+
+class QueryParamJWTAuthentication(StatelessJWTAuthentication):
+    """
+    Reads the access token from the `access_token` query parameter, for
+    clients that cannot set headers (EventSource). Only used on the event
+    stream, since URLs end up in logs.
+    """
+
+    def authenticate(self, request):
+        raw_token = request.query_params.get('access_token')
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return self.get_user(validated_token), validated_token
@@ -0,0 +1,115 @@
+"""
+Local verification of Google ID tokens.
+
+Google signs ID tokens with rotating keys published at GOOGLE_CERTS_URL. The
+certificates are fetched once and kept in-process for as long as the
+response's Cache-Control max-age allows, so a sign-in costs a signature
+check instead of a tokeninfo round trip. Concurrent sign-ins share one
+refetch. If a refetch fails, the certificates already held keep being used
+(Google publishes keys well before signing with them); sign-in only fails
+when they do not include the token's key.
+"""
+import asyncio
+import logging
+import re
+import time
+
+import httpx
+from google.auth import jwt
+from aitodo import upstream
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+DEFAULT_CERTS_MAX_AGE = 300
+# Floor between refetches triggered by tokens with an unknown key id
+MIN_REFRESH_INTERVAL = 60
+# Tolerated clock drift between us and Google when checking iat/exp
+CLOCK_SKEW_SECONDS = 10
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidGoogleToken(Exception):
+    pass
+
+
+class GoogleCertsCache:
+    """
+    Google's signing certificates ({key id: PEM}) with an expiry time.
+    """
+
+    def __init__(self, certs_url=GOOGLE_CERTS_URL):
+        self.certs_url = certs_url
+        self.certs = {}
+        self.expires_at = 0.0
+        self.fetched_at = None
+        self._refreshing = None
+
+    def install(self, certs, max_age=DEFAULT_CERTS_MAX_AGE):
+        """Sets the certificates directly, e.g. with test keys for offline use."""
+        self.certs = dict(certs)
+        self.fetched_at = time.monotonic()
+        self.expires_at = self.fetched_at + max_age
+
+    def is_fresh(self):
+        return bool(self.certs) and time.monotonic() < self.expires_at
+
+    async def refresh(self):
+        # Callers on the same event loop share one fetch; shielded so that a
+        # cancelled caller does not cancel it for the others
+        loop = asyncio.get_running_loop()
+        task = self._refreshing
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = self._refreshing = loop.create_task(self._fetch())
+        await asyncio.shield(task)
+
+    async def _fetch(self):
+        response = await upstream.arequest('GET', self.certs_url)
+        response.raise_for_status()
+        match = MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+        self.install(response.json(), int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE)
+
+    def may_have_rotated(self, key_id):
+        return (
+            key_id is not None
+            and key_id not in self.certs
+            and time.monotonic() - self.fetched_at >= MIN_REFRESH_INTERVAL
+        )
+
+    async def get(self, key_id=None):
+        # Also refetch for an unknown key id, as Google may have rotated keys
+        # early, but not so often that bogus tokens can hammer the endpoint.
+        if not self.is_fresh() or self.may_have_rotated(key_id):
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, ValueError):
+                if not self.certs or (key_id is not None and key_id not in self.certs):
+                    raise
+                logger.warning('Could not refresh Google certificates; using the cached ones', exc_info=True)
+        return self.certs
+
+
+google_certs = GoogleCertsCache()
+
+
+async def verify_google_id_token(token, certs_cache=google_certs):
+    """
+    Verifies signature, expiry and issuer of a Google ID token and returns its
+    claims. The audience is left to the caller. Raises InvalidGoogleToken.
+    """
+    try:
+        key_id = jwt.decode_header(token).get('kid')
+    except ValueError as e:
+        raise InvalidGoogleToken(str(e))
+
+    certs = await certs_cache.get(key_id)
+    try:
+        claims = jwt.decode(token, certs=certs, clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+    except ValueError as e:
+        raise InvalidGoogleToken(str(e))
+
+    if claims.get('iss') not in GOOGLE_ISSUERS:
+        raise InvalidGoogleToken('Wrong issuer')
+    return claims
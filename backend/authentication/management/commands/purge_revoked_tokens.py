@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from authentication.models import RevokedToken
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Deletes revoked refresh tokens that have expired anyway'
+
+    def handle(self, *args, **options):
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(f'Purged {deleted} expired revoked tokens')
@@ -7,4 +7,16 @@ class User(AbstractUser):
     profile_picture = models.URLField(max_length=500, null=True, blank=True)
     
     def __str__(self):
-        return self.email or self.username 
\ No newline at end of file
+        return self.email or self.username 
+
+
+class RevokedToken(models.Model):
+    """
+    A refresh token JTI that may no longer be used, kept until the token
+    expires. Written in batches by authentication.revocation.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
\ No newline at end of file
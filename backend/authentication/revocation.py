@@ -0,0 +1,210 @@
+"""
+Revocation of rotated refresh tokens (BLACKLIST_AFTER_ROTATION).
+
+simplejwt's token_blacklist app records every issued token and does a
+joined lookup plus an insert on every refresh. Here only revoked JTIs are
+stored and refreshes are answered from memory:
+
+- DatabaseRevocationStore keeps revoked JTIs in an in-process dict and
+  persists new revocations to RevokedToken in batches: when a batch is
+  full, or from a background timer at most TOKEN_REVOCATION_FLUSH_INTERVAL
+  seconds after the first unsaved revocation. It pulls rows written by
+  other processes every TOKEN_REVOCATION_SYNC_INTERVAL seconds, when it is
+  next asked about a token, re-reading the most recent rows each time as
+  they may have committed out of id order. Another process therefore sees a revocation
+  within roughly sync interval + flush interval of its next check.
+- RedisRevocationStore keeps one expiring key per JTI in Redis (or
+  anything with the same `set(name, value, ex=)`/`exists(name)` API), so
+  revocations are visible to all processes at once.
+
+Both drop entries once the token would have expired anyway.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseRevocationStore:
+    # Row ids below the high-water mark that every sync reads again
+    sync_overlap = 1000
+
+    def __init__(self, batch_size, flush_interval, sync_interval, purge_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+        self._revoked = {}
+        self._pending = []
+        self._last_row_id = 0
+        self._flushed_at = self._synced_at = self._purged_at = float('-inf')
+        self._flush_timer = None
+        self._lock = threading.RLock()
+
+    def is_revoked(self, jti):
+        self.maintain()
+        with self._lock:
+            return jti in self._revoked
+
+    def revoke(self, jti, exp):
+        """
+        Revokes `jti`; returns False if it already was, so that of two
+        concurrent refreshes with the same token only one goes through.
+        """
+        self.maintain()
+        with self._lock:
+            if jti in self._revoked:
+                return False
+            self._revoked[jti] = exp
+            self._pending.append((jti, exp))
+            full = len(self._pending) >= self.batch_size
+            if not full:
+                self._schedule_flush()
+        if full:
+            self.flush()
+        return True
+
+    def maintain(self):
+        """Runs whichever of flush/sync/purge is due."""
+        now = time.monotonic()
+        if self._pending and now - self._flushed_at >= self.flush_interval:
+            self.flush()
+        if now - self._synced_at >= self.sync_interval:
+            self.sync()
+        if now - self._purged_at >= self.purge_interval:
+            self.purge_expired()
+
+    def _schedule_flush(self):
+        """
+        Makes sure pending revocations are saved within flush_interval even
+        if no further request comes in. Called with the lock held.
+        """
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self._flush_in_background)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._flush_timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not save revoked tokens; retrying')
+            with self._lock:
+                self._schedule_flush()
+        finally:
+            # The timer thread's own connection
+            connections.close_all()
+
+    def flush(self):
+        from .models import RevokedToken
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            RevokedToken.objects.bulk_create(
+                [
+                    RevokedToken(jti=jti, expires_at=datetime.fromtimestamp(exp, tz=dt_timezone.utc))
+                    for jti, exp in pending
+                ],
+                ignore_conflicts=True
+            )
+        except Exception:
+            # Kept for the next flush rather than lost
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+
+    def sync(self):
+        from .models import RevokedToken
+
+        with self._lock:
+            self._synced_at = time.monotonic()
+            # Flushes from different processes can commit out of id order,
+            # so the rows just below the highest id seen are read again
+            since_row_id = self._last_row_id - self.sync_overlap
+        rows = list(
+            RevokedToken.objects.filter(id__gt=since_row_id, expires_at__gt=timezone.now())
+            .order_by('id')
+            .values_list('id', 'jti', 'expires_at')
+        )
+        with self._lock:
+            for row_id, jti, expires_at in rows:
+                self._revoked.setdefault(jti, expires_at.timestamp())
+                self._last_row_id = max(self._last_row_id, row_id)
+
+    def purge_expired(self):
+        from .models import RevokedToken
+
+        now = time.time()
+        with self._lock:
+            self._purged_at = time.monotonic()
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        return RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+class RedisRevocationStore:
+    key_prefix = 'revoked-jti:'
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+
+        return cls(redis.Redis.from_url(url))
+
+    def is_revoked(self, jti):
+        return bool(self.client.exists(self.key_prefix + jti))
+
+    def revoke(self, jti, exp):
+        """Revokes `jti`; returns False if it already was (SET NX)."""
+        ttl = int(exp - time.time())
+        if ttl <= 0:
+            # Expired, so unusable anyway
+            return True
+        return bool(self.client.set(self.key_prefix + jti, 1, ex=ttl, nx=True))
+
+    def flush(self):
+        pass
+
+    def purge_expired(self):
+        # Keys expire on their own
+        return 0
+
+
+def build_revocation_store():
+    if settings.TOKEN_REVOCATION_REDIS_URL:
+        return RedisRevocationStore.from_url(settings.TOKEN_REVOCATION_REDIS_URL)
+    if settings.TOKEN_REVOCATION_REDIS_CLIENT:
+        return RedisRevocationStore(import_string(settings.TOKEN_REVOCATION_REDIS_CLIENT)())
+    return DatabaseRevocationStore(
+        batch_size=settings.TOKEN_REVOCATION_BATCH_SIZE,
+        flush_interval=settings.TOKEN_REVOCATION_FLUSH_INTERVAL,
+        sync_interval=settings.TOKEN_REVOCATION_SYNC_INTERVAL,
+        purge_interval=settings.TOKEN_REVOCATION_PURGE_INTERVAL,
+    )
+
+
+revocation_store = build_revocation_store()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        revocation_store.flush()
+    except Exception:
+        pass
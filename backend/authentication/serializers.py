@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from .revocation import revocation_store
 
 User = get_user_model()
 
@@ -22,4 +26,34 @@ class GoogleAuthSerializer(serializers.Serializer):
 class AuthResponseSerializer(serializers.Serializer):
     user = UserSerializer()
     access_token = serializers.CharField()
-    refresh_token = serializers.CharField() 
\ No newline at end of file
+    refresh_token = serializers.CharField() 
+
+
+class RevokingTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer that enforces BLACKLIST_AFTER_ROTATION through
+    `revocation_store` instead of the token_blacklist app: a rotated refresh
+    token is revoked and cannot be replayed. The check and the revocation
+    are one step (`revoke` reports whether the token was already revoked),
+    so two concurrent refreshes with the same token cannot both succeed.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        jti = refresh[api_settings.JTI_CLAIM]
+        if revocation_store.is_revoked(jti):
+            raise TokenError('Token is blacklisted')
+
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            if not revocation_store.revoke(jti, refresh['exp']):
+                raise TokenError('Token is blacklisted')
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
\ No newline at end of file
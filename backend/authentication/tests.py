@@ -0,0 +1,175 @@
+import asyncio
+import time
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+import httpx
+import rsa
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from google.auth import crypt, jwt
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import serializers
+from .google_tokens import GoogleCertsCache, InvalidGoogleToken, google_certs, verify_google_id_token
+from .models import RevokedToken
+from .revocation import DatabaseRevocationStore, RedisRevocationStore
+
+EXP = time.time() + 3600
+
+
+def make_store():
+    # Long intervals: flushes and syncs only run when a test calls them
+    return DatabaseRevocationStore(batch_size=100, flush_interval=3600, sync_interval=3600, purge_interval=3600)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, name, value, ex=None, nx=False):
+        if nx and name in self.values:
+            return None
+        self.values[name] = value
+        return True
+
+    def exists(self, name):
+        return int(name in self.values)
+
+
+@override_settings(AI_PLAN_JOB_WORKERS=0)
+class RevocationTests(TestCase):
+    def test_database_store_revokes_once(self):
+        store = make_store()
+
+        self.assertTrue(store.revoke('jti-1', EXP))
+        self.assertFalse(store.revoke('jti-1', EXP))
+        self.assertTrue(store.is_revoked('jti-1'))
+
+    def test_redis_store_revokes_once(self):
+        store = RedisRevocationStore(FakeRedis())
+
+        self.assertTrue(store.revoke('jti-1', EXP))
+        self.assertFalse(store.revoke('jti-1', EXP))
+        self.assertTrue(store.is_revoked('jti-1'))
+
+    def test_concurrent_refreshes_with_one_token_rotate_once(self):
+        store = make_store()
+        token = str(RefreshToken.for_user(get_user_model().objects.create(username='tester')))
+
+        # Both requests have passed the is_revoked check before either revokes
+        with mock.patch.object(serializers, 'revocation_store', store), \
+                mock.patch.object(store, 'is_revoked', return_value=False):
+            first = serializers.RevokingTokenRefreshSerializer(data={'refresh': token})
+            second = serializers.RevokingTokenRefreshSerializer(data={'refresh': token})
+            self.assertTrue(first.is_valid())
+            with self.assertRaises(TokenError):
+                second.is_valid()
+
+    def test_sync_picks_up_rows_committed_out_of_id_order(self):
+        store = make_store()
+        expires_at = datetime.fromtimestamp(EXP, tz=dt_timezone.utc)
+        RevokedToken.objects.create(id=10, jti='committed-first', expires_at=expires_at)
+        store.sync()
+        # A flush elsewhere that got a lower id but committed later
+        RevokedToken.objects.create(id=5, jti='committed-later', expires_at=expires_at)
+        store.sync()
+
+        self.assertIn('committed-first', store._revoked)
+        self.assertIn('committed-later', store._revoked)
+
+    def test_flush_persists_revocations(self):
+        store = make_store()
+        store.revoke('jti-1', EXP)
+        store.revoke('jti-2', EXP)
+        store.flush()
+
+        self.assertEqual(set(RevokedToken.objects.values_list('jti', flat=True)), {'jti-1', 'jti-2'})
+
+
+# Test signing key, standing in for one of Google's
+_public_key, _private_key = rsa.newkeys(1024)
+CERTS = {'test-key': _public_key.save_pkcs1().decode()}
+SIGNER = crypt.RSASigner.from_string(_private_key.save_pkcs1().decode(), key_id='test-key')
+
+
+def google_id_token(signer=SIGNER, **claims):
+    now = int(time.time())
+    return jwt.encode(signer, {
+        'iss': 'https://accounts.google.com',
+        'aud': 'our-client-id',
+        'sub': 'google-123',
+        'email': 'user@example.com',
+        'name': 'Test User',
+        'iat': now,
+        'exp': now + 600,
+        **claims,
+    }).decode()
+
+
+def installed_cache(max_age=300):
+    cache = GoogleCertsCache(certs_url='http://certs.test/')
+    cache.install(CERTS, max_age=max_age)
+    return cache
+
+
+class GoogleTokenTests(SimpleTestCase):
+    def verify(self, token, cache):
+        return asyncio.run(verify_google_id_token(token, certs_cache=cache))
+
+    def test_token_signed_with_an_installed_key_verifies(self):
+        claims = self.verify(google_id_token(), installed_cache())
+
+        self.assertEqual(claims['sub'], 'google-123')
+
+    def test_wrong_issuer_is_rejected(self):
+        with self.assertRaises(InvalidGoogleToken):
+            self.verify(google_id_token(iss='https://evil.example.com'), installed_cache())
+
+    def test_token_from_another_key_is_rejected(self):
+        other_key = rsa.newkeys(1024)[1]
+        signer = crypt.RSASigner.from_string(other_key.save_pkcs1().decode(), key_id='test-key')
+
+        with self.assertRaises(InvalidGoogleToken):
+            self.verify(google_id_token(signer=signer), installed_cache())
+
+    def test_failed_refresh_falls_back_to_held_keys(self):
+        cache = installed_cache(max_age=0)
+        refetch = mock.AsyncMock(side_effect=httpx.ConnectTimeout('timed out'))
+
+        with mock.patch('aitodo.upstream.arequest', refetch):
+            claims = self.verify(google_id_token(), cache)
+
+        self.assertEqual(claims['sub'], 'google-123')
+        refetch.assert_awaited()
+
+    def test_failed_refresh_fails_for_an_unknown_key(self):
+        cache = installed_cache(max_age=0)
+        unknown = crypt.RSASigner.from_string(_private_key.save_pkcs1().decode(), key_id='rotated-key')
+
+        with mock.patch('aitodo.upstream.arequest', mock.AsyncMock(side_effect=httpx.ConnectTimeout('timed out'))):
+            with self.assertRaises(httpx.ConnectTimeout):
+                self.verify(google_id_token(signer=unknown), cache)
+
+
+@override_settings(GOOGLE_CLIENT_ID='our-client-id', AI_PLAN_JOB_WORKERS=0)
+class GoogleSignInTests(APITestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(google_certs, certs={}, expires_at=0.0, fetched_at=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        google_certs.install(CERTS)
+
+    def test_sign_in_issues_tokens(self):
+        response = self.client.post('/api/auth/google/', {'token': google_id_token()}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['email'], 'user@example.com')
+        self.assertIn('access_token', response.json())
+
+    def test_token_for_another_client_is_rejected(self):
+        response = self.client.post('/api/auth/google/', {'token': google_id_token(aud='someone-else')}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(get_user_model().objects.exists())
@@ -1,104 +1,139 @@
-import requests
+import logging
+
+import httpx
+from asgiref.sync import sync_to_async
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from rest_framework_simplejwt.tokens import RefreshToken
-from .serializers import GoogleAuthSerializer, AuthResponseSerializer
+from rest_framework_simplejwt.views import TokenRefreshView
+from aitodo.async_views import async_api_view
+from .google_tokens import InvalidGoogleToken, verify_google_id_token
+from .serializers import GoogleAuthSerializer, AuthResponseSerializer, RevokingTokenRefreshSerializer
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def google_auth(request):
+@async_api_view(['POST'], authenticated=False)
+async def google_auth(request):
     """
     Authenticate user with Google OAuth token
     """
-    print(f"Received request data: {request.data}")  # Debug log
-    
     serializer = GoogleAuthSerializer(data=request.data)
     if not serializer.is_valid():
-        print(f"Serializer errors: {serializer.errors}")  # Debug log
+        logger.debug('Google sign-in request rejected', extra={'errors': serializer.errors})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     token = serializer.validated_data['token']
-    print(f"Token received: {token[:20]}...")  # Debug log
     
     try:
-        # Verify the ID token with Google
-        google_response = requests.get(
-            'https://oauth2.googleapis.com/tokeninfo',
-            params={'id_token': token}
-        )
-        
-        if google_response.status_code != 200:
+        # Verify the ID token locally against Google's cached signing keys
+        try:
+            user_info = await verify_google_id_token(token)
+        except InvalidGoogleToken as e:
+            logger.debug('Invalid Google token', extra={'reason': str(e)})
             return Response(
                 {'error': 'Invalid Google token'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        user_info = google_response.json()
-        
         # Check if the token is for our app (if GOOGLE_CLIENT_ID is set)
         if settings.GOOGLE_CLIENT_ID and user_info.get('aud') != settings.GOOGLE_CLIENT_ID:
+            logger.debug('Google token for another client', extra={'aud': user_info.get('aud')})
             return Response(
                 {'error': 'Invalid client ID'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        google_id = user_info.get('sub')
-        email = user_info.get('email')
-        name = user_info.get('name', '')
-        picture = user_info.get('picture', '')
-        
-        # Get or create user
-        user, created = User.objects.get_or_create(
-            google_id=google_id,
-            defaults={
-                'email': email,
-                'username': email,
-                'first_name': name.split()[0] if name else '',
-                'last_name': ' '.join(name.split()[1:]) if name and len(name.split()) > 1 else '',
-                'profile_picture': picture,
-            }
-        )
-        
-        # Update user info if not newly created
-        if not created:
-            user.email = email
-            user.first_name = name.split()[0] if name else user.first_name
-            user.last_name = ' '.join(name.split()[1:]) if name and len(name.split()) > 1 else user.last_name
-            user.profile_picture = picture
-            user.save()
-        
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
-        
-        response_data = {
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'profile_picture': user.profile_picture,
-            },
-            'access_token': str(refresh.access_token),
-            'refresh_token': str(refresh),
-        }
+        response_data = await sync_to_async(login_google_user)(user_info)
         
         return Response(response_data, status=status.HTTP_200_OK)
         
-    except requests.RequestException:
+    except httpx.HTTPError:
+        logger.warning('Could not fetch Google signing keys', exc_info=True)
         return Response(
             {'error': 'Failed to verify Google token'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     except Exception as e:
+        logger.exception('Google sign-in failed')
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        ) 
\ No newline at end of file
+        )
+
+
+def login_google_user(user_info):
+    """
+    Creates or refreshes the user for verified Google token claims and issues JWTs
+    """
+    user = sync_google_user(user_info)
+    
+    # Generate JWT tokens
+    refresh = RefreshToken.for_user(user)
+    
+    response_data = {
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'profile_picture': user.profile_picture,
+        },
+        'access_token': str(refresh.access_token),
+        'refresh_token': str(refresh),
+    }
+    
+    return response_data
+
+
+def sync_google_user(user_info):
+    """
+    Returns the user for the Google account, creating it on first login.
+    Returning users cost one SELECT, plus a single UPDATE of just the changed
+    columns when their Google profile changed since the last login.
+    """
+    google_id = user_info.get('sub')
+    email = user_info.get('email')
+    name_parts = user_info.get('name', '').split()
+    picture = user_info.get('picture', '')
+    
+    user = User.objects.filter(google_id=google_id).first()
+    if user is None:
+        try:
+            # Savepoint so a concurrent first login only loses the race
+            with transaction.atomic():
+                return User.objects.create(
+                    google_id=google_id,
+                    email=email,
+                    username=email,
+                    first_name=name_parts[0] if name_parts else '',
+                    last_name=' '.join(name_parts[1:]),
+                    profile_picture=picture,
+                )
+        except IntegrityError:
+            user = User.objects.get(google_id=google_id)
+    
+    profile = {'email': email, 'profile_picture': picture}
+    if name_parts:
+        profile['first_name'] = name_parts[0]
+    if len(name_parts) > 1:
+        profile['last_name'] = ' '.join(name_parts[1:])
+    
+    changed = [field for field, value in profile.items() if getattr(user, field) != value]
+    if changed:
+        for field in changed:
+            setattr(user, field, profile[field])
+        user.save(update_fields=changed)
+    return user
+
+
+class RevokingTokenRefreshView(TokenRefreshView):
+    """
+    Refresh endpoint that rejects refresh tokens revoked by an earlier rotation.
+    """
+    serializer_class = RevokingTokenRefreshSerializer
\ No newline at end of file
@@ -0,0 +1,19 @@
+"""
+Standalone benchmarks for the backend hot paths.
+
+Run them from the backend directory, e.g. `python -m benchmarks.login_queries`.
+Each script works against a throwaway test database, never the real one.
+"""
+import os
+
+import django
+
+
+def setup_test_database():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aitodo.settings')
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
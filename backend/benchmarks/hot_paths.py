@@ -0,0 +1,198 @@
+"""
+Latency and SQL query counts of the todo API and login hot paths for users
+with 100, 10k and 100k todos, checked against per-endpoint query budgets.
+
+    python -m benchmarks.hot_paths
+    python -m benchmarks.hot_paths --sizes 100,10000 --repeat 20
+
+Requests go through the full stack (URL routing, JWT authentication,
+middleware, rendering). The query count of every path must stay within its
+budget, and the same for every table size; otherwise the script lists the
+offenders and exits with status 1, so an N+1 or a query that grows with the
+table fails the build.
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import timedelta
+from unittest import mock
+
+from benchmarks import setup_test_database
+
+setup_test_database()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+from api.changes import encode_cursor  # noqa: E402
+from api.models import Todo  # noqa: E402
+
+User = get_user_model()
+
+SIZES = [100, 10_000, 100_000]
+
+# Queries per request, including the one JWT authentication spends loading
+# the user
+QUERY_BUDGETS = {
+    'list': 3,
+    'list, filtered + ordered': 3,
+    'list, next page': 3,
+    'list, not modified': 2,
+    'retrieve': 2,
+    'create': 2,
+    'patch': 3,
+    'delete': 6,
+    'bulk create 50': 4,
+    'changes': 3,
+    'stats, uncached': 2,
+    'login, returning user': 1,
+}
+
+GOOGLE_CLAIMS = {
+    'sub': 'google-hot-paths',
+    'email': 'hot-paths@example.com',
+    'name': 'Hot Paths',
+    'picture': 'https://example.com/a.png',
+}
+
+
+def seed(size):
+    user = User.objects.create(username=f'bench-{size}', email=f'bench-{size}@example.com')
+    now = timezone.now()
+    statuses = [key for key, _ in Todo.STATUS_CHOICES]
+    priorities = [key for key, _ in Todo.PRIORITY_CHOICES]
+    Todo.objects.bulk_create(
+        [
+            Todo(
+                user=user,
+                title=f'Todo {i}',
+                description='x' * 80,
+                status=statuses[i % len(statuses)],
+                priority=priorities[i % len(priorities)],
+                due_date=now + timedelta(days=i % 30 - 10) if i % 4 == 0 else None,
+            )
+            for i in range(size)
+        ],
+        batch_size=2000
+    )
+    # Seeded as of a month ago, so that /changes/ only sees what the run changes
+    month_ago = now - timedelta(days=30)
+    Todo.objects.filter(user=user).update(created_at=month_ago, updated_at=month_ago)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    return user, client
+
+
+def scenarios(user, client):
+    """(name, setup, request) triples; setup runs before every request, unmeasured."""
+    todo_id = Todo.objects.filter(user=user).order_by('-id').values_list('id', flat=True)[0]
+    state = {
+        # A minute-old cursor: a typical incremental sync
+        'cursor': encode_cursor(timezone.now() - timedelta(minutes=1)),
+        'completed': False,
+    }
+
+    def nothing():
+        pass
+
+    def load_first_page():
+        response = client.get('/api/todos/')
+        state['etag'] = response['ETag']
+        state['next'] = response.json()['next']
+
+    def new_todo():
+        state['todo_id'] = Todo.objects.create(user=user, title='To delete').pk
+
+    def clear_stats():
+        caches[settings.TODO_STATS_CACHE].clear()
+
+    def patch():
+        state['completed'] = not state['completed']
+        status = 'completed' if state['completed'] else 'pending'
+        return client.patch(f'/api/todos/{todo_id}/', {'status': status}, format='json')
+
+    def login():
+        verify = mock.AsyncMock(return_value=GOOGLE_CLAIMS)
+        with mock.patch('authentication.views.verify_google_id_token', verify):
+            return client.post('/api/auth/google/', {'token': 'x' * 40}, format='json')
+
+    return [
+        ('list', nothing, lambda: client.get('/api/todos/')),
+        ('list, filtered + ordered', nothing, lambda: client.get('/api/todos/?status=pending&ordering=-priority')),
+        ('list, next page', load_first_page, lambda: client.get(state['next'])),
+        ('list, not modified', load_first_page,
+         lambda: client.get('/api/todos/', HTTP_IF_NONE_MATCH=state['etag'])),
+        ('retrieve', nothing, lambda: client.get(f'/api/todos/{todo_id}/')),
+        ('create', nothing, lambda: client.post('/api/todos/', {'title': 'New todo'}, format='json')),
+        ('patch', nothing, patch),
+        ('delete', new_todo, lambda: client.delete(f'/api/todos/{state["todo_id"]}/')),
+        ('bulk create 50', nothing, lambda: client.post(
+            '/api/todos/bulk/', {'create': [{'title': f'Bulk {i}'} for i in range(50)]}, format='json'
+        )),
+        ('changes', nothing, lambda: client.get('/api/todos/changes/', {'since': state['cursor']})),
+        ('stats, uncached', clear_stats, lambda: client.get('/api/todos/stats/')),
+        ('login, returning user', nothing, login),
+    ]
+
+
+def measure(size, repeat):
+    """Returns (name, queries, median ms) for every scenario."""
+    user, client = seed(size)
+    rows = []
+    for name, setup, request in scenarios(user, client):
+        # The first call also creates the login user
+        setup()
+        response = request()
+        if response.status_code >= 400:
+            raise RuntimeError(f'{name}: HTTP {response.status_code} {response.content[:200]!r}')
+
+        setup()
+        with CaptureQueriesContext(connection) as queries:
+            request()
+        # Read now: the next request_started signal clears the query log
+        query_count = len(queries)
+
+        timings = []
+        for _ in range(repeat):
+            setup()
+            start = time.perf_counter()
+            request()
+            timings.append(time.perf_counter() - start)
+        rows.append((name, query_count, statistics.median(timings) * 1000))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='todos per user, comma separated')
+    parser.add_argument('--repeat', type=int, default=30, help='timed requests per path')
+    args = parser.parse_args()
+
+    failures = []
+    query_counts = {}
+    for size in [int(size) for size in args.sizes.split(',')]:
+        print(f'{size} todos:')
+        print(f'  {"path":26} {"queries":>7} {"budget":>7} {"median ms":>10}')
+        for name, queries, median_ms in measure(size, args.repeat):
+            budget = QUERY_BUDGETS[name]
+            print(f'  {name:26} {queries:7d} {budget:7d} {median_ms:10.2f}')
+            if queries > budget:
+                failures.append(f'{name} at {size} todos: {queries} queries, budget {budget}')
+            if query_counts.setdefault(name, queries) != queries:
+                failures.append(f'{name}: {queries} queries at {size} todos, {query_counts[name]} at fewer')
+
+    if failures:
+        print('Query budget exceeded:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Rows per second for the todo list, serializer + JSONRenderer versus
+`.values()` + ORJSONRenderer, on 10k todos.
+
+    python -m benchmarks.list_rendering
+"""
+import time
+
+from benchmarks import setup_test_database
+
+setup_test_database()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from aitodo.renderers import ORJSONRenderer  # noqa: E402
+from api.models import Todo  # noqa: E402
+from api.serializers import TodoListSerializer  # noqa: E402
+
+TODOS = 10_000
+PAGE_SIZE = 200
+
+
+def rows_per_second(func, rows, repeat=3):
+    best = min(_timed(func) for _ in range(repeat))
+    return rows / best
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    user = get_user_model().objects.create(username='bench')
+    Todo.objects.bulk_create(
+        [Todo(user=user, title=f'Todo {i}', description='x' * 80) for i in range(TODOS)],
+        batch_size=1000
+    )
+    queryset = Todo.objects.filter(user=user)
+    fields = TodoListSerializer.Meta.fields
+
+    def serializer_path():
+        JSONRenderer().render(TodoListSerializer(queryset, many=True).data)
+
+    def values_path():
+        ORJSONRenderer().render(list(queryset.values(*fields)))
+
+    print(f'Rendering all {TODOS} todos:')
+    print(f'  TodoListSerializer + JSONRenderer  {rows_per_second(serializer_path, TODOS):10.0f} rows/s')
+    print(f'  .values() + ORJSONRenderer         {rows_per_second(values_path, TODOS):10.0f} rows/s')
+
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def endpoint():
+        url = f'/api/todos/?page_size={PAGE_SIZE}'
+        while url:
+            url = client.get(url).json()['next']
+
+    print(f'Paging through GET /api/todos/ ({PAGE_SIZE} per page):')
+    print(f'  current list endpoint              {rows_per_second(endpoint, TODOS):10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Open-loop load test of the planning and todo endpoints: requests are
+started at a fixed rate whether or not earlier ones have finished, and
+latency is measured from when each request was due, so a server that
+falls behind shows it in the percentiles.
+
+By default the backend runs in this process under uvicorn, on a throwaway
+test database, with the stub inference server (benchmarks.stub_inference)
+standing in for the model:
+
+    python -m benchmarks.load_test --rps 50 --duration 30
+    python -m benchmarks.load_test --mix plan=1 --rps 20 --stub-latency 2 --stub-error-rate 0.05
+
+Or against a running server (which also needs AI_INFERENCE_URL pointing at
+a stub and a high AI_PLAN_RATE to measure planning):
+
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --token <access token>
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+
+import httpx
+
+OPERATIONS = ['list', 'stats', 'create', 'update', 'delete', 'plan']
+DEFAULT_MIX = 'list=4,create=2,update=2,delete=1,stats=1,plan=1'
+PLAN_TASKS = [
+    'Write quarterly report', 'Review pull requests', 'Book dentist appointment', 'Plan team offsite',
+    'Answer support tickets', 'Update dependencies', 'Prepare demo', 'Renew passport',
+]
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f'Unknown operations: {", ".join(sorted(unknown))}')
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadTest:
+    def __init__(self, client, plan_variety, seed_ids=()):
+        self.client = client
+        self.plan_task_lists = [
+            random.sample(PLAN_TASKS, random.randint(2, 5)) for _ in range(plan_variety)
+        ]
+        self.todo_ids = deque(seed_ids)
+        self.created = 0
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(int)
+
+    async def list(self):
+        return await self.client.get('/api/todos/', params={'page_size': 50})
+
+    async def stats(self):
+        return await self.client.get('/api/todos/stats/')
+
+    async def create(self):
+        self.created += 1
+        response = await self.client.post('/api/todos/', json={'title': f'Load test todo {self.created}'})
+        if response.status_code == 201:
+            self.todo_ids.append(response.json()['id'])
+        return response
+
+    async def update(self):
+        if not self.todo_ids:
+            return await self.create()
+        todo_id = random.choice(self.todo_ids)
+        status = random.choice(['pending', 'in_progress', 'completed'])
+        return await self.client.patch(f'/api/todos/{todo_id}/', json={'status': status})
+
+    async def delete(self):
+        if not self.todo_ids:
+            return await self.create()
+        return await self.client.delete(f'/api/todos/{self.todo_ids.popleft()}/')
+
+    async def plan(self):
+        return await self.client.post('/api/todos/plan/', json={'tasks': random.choice(self.plan_task_lists)})
+
+    async def timed(self, name, due):
+        try:
+            response = await getattr(self, name)()
+        except httpx.HTTPError as e:
+            self.errors[name] += 1
+            self.statuses[type(e).__name__] += 1
+        else:
+            if response.status_code >= 400:
+                self.errors[name] += 1
+            self.statuses[response.status_code] += 1
+        self.latencies[name].append(time.perf_counter() - due)
+
+    async def run(self, mix, rps, duration):
+        names, weights = list(mix), list(mix.values())
+        start = time.perf_counter()
+        interval = 1 / rps
+        tasks = []
+        for i in range(int(rps * duration)):
+            due = start + i * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = random.choices(names, weights)[0]
+            tasks.append(asyncio.create_task(self.timed(name, due)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        total = sum(len(values) for values in self.latencies.values())
+        print(f'{total} requests in {elapsed:.1f}s ({total / elapsed:.1f}/s)')
+        print(f'  {"operation":10} {"count":>7} {"errors":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}')
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            errors = self.errors[name]
+            print(
+                f'  {name:10} {len(values):7d} {errors:7d} '
+                + ' '.join(f'{percentile(values, q) * 1000:9.1f}' for q in (0.5, 0.95, 0.99))
+                + f' {values[-1] * 1000:9.1f}'
+            )
+        print('  status codes: ' + ', '.join(f'{code}: {count}' for code, count in sorted(self.statuses.items(), key=str)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_thread(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def start_local_backend(args):
+    """
+    Starts the stub inference server and the backend (on a test database)
+    in this process; returns (base URL, access token, seeded todo ids, stub).
+    """
+    from benchmarks.stub_inference import StubOptions, make_server
+
+    stub = make_server(port=free_port(), options=StubOptions(
+        latency=args.stub_latency,
+        error_rate=args.stub_error_rate,
+    ))
+    start_thread(stub.serve_forever)
+
+    # Read by the settings module, so set before Django starts
+    os.environ['AI_INFERENCE_URL'] = f'http://127.0.0.1:{stub.server_address[1]}/chat/completions'
+    os.environ.setdefault('AI_PLAN_RATE', '1000000/min')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aitodo.settings')
+
+    from django.conf import settings
+    database = settings.DATABASES['default']
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        # An in-memory test database would be shared between threads in
+        # shared-cache mode, which fails concurrent writes instead of waiting
+        database.setdefault('TEST', {})['NAME'] = os.path.join(tempfile.mkdtemp(), 'load_test.sqlite3')
+
+    from benchmarks import setup_test_database
+    setup_test_database()
+
+    import uvicorn
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from api.models import Todo
+
+    user = get_user_model().objects.create(username='loadtest', email='loadtest@example.com')
+    todos = Todo.objects.bulk_create([Todo(user=user, title=f'Seed todo {i}') for i in range(args.seed_todos)])
+    token = str(RefreshToken.for_user(user).access_token)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        'aitodo.asgi:application', host='127.0.0.1', port=port, log_level='warning', lifespan='off'
+    ))
+    start_thread(server.run)
+    while not server.started:
+        time.sleep(0.05)
+    return f'http://127.0.0.1:{port}', token, [todo.pk for todo in todos], stub
+
+
+async def main_async(args, base_url, token, seed_ids):
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={'Authorization': f'Bearer {token}'},
+        limits=limits,
+        timeout=args.timeout,
+    ) as client:
+        load_test = LoadTest(client, args.plan_variety, seed_ids)
+        if args.warmup:
+            await load_test.run({'list': 1}, args.rps, args.warmup)
+            load_test.latencies.clear()
+            load_test.errors.clear()
+            load_test.statuses.clear()
+        elapsed = await load_test.run(args.mix, args.rps, args.duration)
+        load_test.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rps', type=float, default=20, help='requests started per second')
+    parser.add_argument('--duration', type=float, default=20, help='seconds')
+    parser.add_argument('--warmup', type=float, default=2, help='seconds of unmeasured list requests first')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help=f'operation weights (default {DEFAULT_MIX})')
+    parser.add_argument('--plan-variety', type=int, default=20, help='distinct task lists sent to /plan/')
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--url', help='base URL of a running backend instead of starting one')
+    parser.add_argument('--token', help='access token for --url')
+    parser.add_argument('--seed-todos', type=int, default=200)
+    parser.add_argument('--stub-latency', type=float, default=1.0)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = None
+    if args.url:
+        if not args.token:
+            parser.error('--url needs --token')
+        base_url, token, seed_ids = args.url.rstrip('/'), args.token, []
+    else:
+        base_url, token, seed_ids, stub = start_local_backend(args)
+
+    asyncio.run(main_async(args, base_url, token, seed_ids))
+    if stub is not None:
+        print(f'  stub inference: {stub.stats.snapshot()}')
+
+
+if __name__ == '__main__':
+    main()
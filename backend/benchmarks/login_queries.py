@@ -0,0 +1,83 @@
+"""
+Queries issued per Google login, before and after the narrow-update change.
+
+    python -m benchmarks.login_queries
+"""
+import time
+
+from benchmarks import setup_test_database
+
+setup_test_database()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from authentication.views import sync_google_user  # noqa: E402
+
+User = get_user_model()
+
+CLAIMS = {
+    'sub': 'google-bench-1',
+    'email': 'bench@example.com',
+    'name': 'Bench Mark',
+    'picture': 'https://example.com/a.png',
+}
+
+SCENARIOS = [
+    ('first login', CLAIMS),
+    ('returning, unchanged', CLAIMS),
+    ('returning, new picture', {**CLAIMS, 'picture': 'https://example.com/b.png'}),
+]
+
+
+def legacy_sync_google_user(user_info):
+    """The original login path: get_or_create, then a full save on every login."""
+    google_id = user_info.get('sub')
+    email = user_info.get('email')
+    name = user_info.get('name', '')
+    picture = user_info.get('picture', '')
+    user, created = User.objects.get_or_create(
+        google_id=google_id,
+        defaults={
+            'email': email,
+            'username': email,
+            'first_name': name.split()[0] if name else '',
+            'last_name': ' '.join(name.split()[1:]) if name and len(name.split()) > 1 else '',
+            'profile_picture': picture,
+        }
+    )
+    if not created:
+        user.email = email
+        user.first_name = name.split()[0] if name else user.first_name
+        user.last_name = ' '.join(name.split()[1:]) if name and len(name.split()) > 1 else user.last_name
+        user.profile_picture = picture
+        user.save()
+    return user
+
+
+def measure(sync_user, repeat=200):
+    User.objects.all().delete()
+    rows = []
+    for label, claims in SCENARIOS:
+        with CaptureQueriesContext(connection) as queries:
+            sync_user(claims)
+        writes = sum(1 for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE')))
+        rows.append((label, len(queries), writes))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        sync_user(CLAIMS)
+    per_login_ms = (time.perf_counter() - start) / repeat * 1000
+    return rows, per_login_ms
+
+
+def main():
+    for title, sync_user in (('before', legacy_sync_google_user), ('after', sync_google_user)):
+        rows, per_login_ms = measure(sync_user)
+        print(f'{title}: {per_login_ms:.3f} ms per returning login')
+        for label, query_count, write_count in rows:
+            print(f'  {label:<24} {query_count} queries, {write_count} writes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Parse latency and success rate of plan extraction over recorded model
+outputs (benchmarks/plan_outputs.jsonl): the old greedy regex + json.loads +
+AIPlanningResponseSerializer path versus api.plan_parsing, one-shot and fed
+in 16-character stream chunks.
+
+    python -m benchmarks.plan_parsing
+"""
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aitodo.settings')
+django.setup()
+
+from rest_framework import serializers  # noqa: E402
+from api.plan_parsing import JSONObjectExtractor, parse_plan, plan_from_value  # noqa: E402
+
+CORPUS = Path(__file__).with_name('plan_outputs.jsonl')
+CHUNK = 16
+REPEAT = 2000
+
+
+class AIPlanningResponseSerializer(serializers.Serializer):
+    # The serializer the old path validated with, kept here for comparison
+    plan = serializers.CharField()
+    prioritized_tasks = serializers.ListField(child=serializers.DictField())
+
+
+def legacy_parse(content, tasks):
+    json_match = re.search(r'\{.*\}', content, re.DOTALL)
+    if json_match:
+        try:
+            plan = json.loads(json_match.group())
+        except json.JSONDecodeError:
+            return None
+        serializer = AIPlanningResponseSerializer(data=plan)
+        return dict(serializer.data) if serializer.is_valid() else None
+    return None
+
+
+def plan_parsing(content, tasks):
+    plan, parsed = parse_plan(content, tasks)
+    return plan if parsed else None
+
+
+def plan_parsing_streamed(content, tasks):
+    extractor = JSONObjectExtractor()
+    for i in range(0, len(content), CHUNK):
+        if extractor.feed(content[i:i + CHUNK]) is not None:
+            break
+    plan, parsed = plan_from_value(extractor.value, content, tasks)
+    return plan if parsed else None
+
+
+def main():
+    with open(CORPUS, encoding='utf-8') as f:
+        corpus = [json.loads(line) for line in f]
+
+    print(f'{len(corpus)} recorded outputs, {REPEAT} passes each')
+    for name, parse in [
+        ('regex + json + serializer', legacy_parse),
+        ('plan_parsing', plan_parsing),
+        (f'plan_parsing, {CHUNK}-char chunks', plan_parsing_streamed),
+    ]:
+        correct = 0
+        failures = []
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            for entry in corpus:
+                parse(entry['content'], entry['tasks'])
+        elapsed = time.perf_counter() - start
+        for entry in corpus:
+            usable = parse(entry['content'], entry['tasks']) is not None
+            if usable == entry['usable']:
+                correct += 1
+            else:
+                failures.append(entry['case'])
+        per_parse = elapsed / (REPEAT * len(corpus)) * 1e6
+        print(f'  {name:34} {per_parse:7.1f} us/parse  {correct}/{len(corpus)} as expected')
+        for case in failures:
+            print(f'      wrong: {case}')
+
+
+if __name__ == '__main__':
+    main()
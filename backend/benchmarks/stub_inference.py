@@ -0,0 +1,180 @@
+"""
+Stand-in for the chat completions API, for running and load testing AI
+planning offline. It answers with a well-formed plan for the tasks in the
+prompt (one plan per list for batched prompts) after a configurable
+latency, streams when the request asks for it, and fails a configurable
+share of requests.
+
+    python -m benchmarks.stub_inference --port 8090 --latency 1.5 --error-rate 0.02
+    AI_INFERENCE_URL=http://127.0.0.1:8090/chat/completions python manage.py runserver
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TASK_LINE_RE = re.compile(r'^- (.*)$', re.MULTILINE)
+LIST_HEADER_RE = re.compile(r'^List \d+:$', re.MULTILINE)
+PRIORITIES = ['high', 'medium', 'low']
+
+
+@dataclass
+class StubOptions:
+    latency: float = 1.0
+    # Spread of the latency: each request takes latency * (1 +- jitter)
+    jitter: float = 0.2
+    # Streamed responses: time to the first chunk, and number of chunks
+    first_token: float = 0.2
+    chunks: int = 20
+    error_rate: float = 0.0
+    error_status: int = 503
+
+
+class StubStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, error):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors}
+
+
+def make_plan(tasks):
+    return {
+        'plan': f'Work through these {len(tasks)} tasks in order, starting with the most urgent.',
+        'prioritized_tasks': [
+            {
+                'task': task,
+                'priority': PRIORITIES[i * len(PRIORITIES) // max(len(tasks), 1)],
+                'estimated_time': f'{15 + 15 * (i % 4)} minutes',
+                'order': i + 1,
+            }
+            for i, task in enumerate(tasks)
+        ],
+    }
+
+
+def completion_text(payload):
+    prompt = payload['messages'][-1]['content']
+    blocks = LIST_HEADER_RE.split(prompt)[1:]
+    if blocks:
+        content = {'plans': [make_plan(TASK_LINE_RE.findall(block)) for block in blocks]}
+    else:
+        content = make_plan(TASK_LINE_RE.findall(prompt))
+    # Models tend to wrap the JSON in markdown
+    return f'```json\n{json.dumps(content, indent=2)}\n```'
+
+
+def make_handler(options, stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            latency = options.latency * random.uniform(1 - options.jitter, 1 + options.jitter)
+
+            failed = random.random() < options.error_rate
+            stats.record(failed)
+            if failed:
+                time.sleep(latency / 4)
+                self.send_json(options.error_status, {'error': {'message': 'Stub inference failure'}})
+            elif payload.get('stream'):
+                self.stream(completion_text(payload), latency)
+            else:
+                time.sleep(latency)
+                self.send_json(200, {
+                    'model': payload.get('model'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': completion_text(payload)}}],
+                })
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def stream(self, text, latency):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            time.sleep(min(options.first_token, latency))
+            chunks = max(options.chunks, 1)
+            size = -(-len(text) // chunks)
+            delay = max(latency - options.first_token, 0) / chunks
+            for start in range(0, len(text), size):
+                event = {'choices': [{'index': 0, 'delta': {'content': text[start:start + size]}}]}
+                self.write_chunk(f'data: {json.dumps(event)}\n\n'.encode())
+                time.sleep(delay)
+            self.write_chunk(b'data: [DONE]\n\n')
+            self.write_chunk(b'')
+
+        def write_chunk(self, data):
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+
+    return Handler
+
+
+def make_server(host='127.0.0.1', port=8090, options=None):
+    """
+    Returns an unstarted server; its `stats` attribute counts requests and
+    injected errors.
+    """
+    stats = StubStats()
+    server = ThreadingHTTPServer((host, port), make_handler(options or StubOptions(), stats))
+    server.daemon_threads = True
+    server.stats = stats
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=StubOptions.latency, help='seconds per completion')
+    parser.add_argument('--jitter', type=float, default=StubOptions.jitter)
+    parser.add_argument('--first-token', type=float, default=StubOptions.first_token)
+    parser.add_argument('--chunks', type=int, default=StubOptions.chunks)
+    parser.add_argument('--error-rate', type=float, default=StubOptions.error_rate)
+    parser.add_argument('--error-status', type=int, default=StubOptions.error_status)
+    args = parser.parse_args()
+
+    options = StubOptions(
+        latency=args.latency,
+        jitter=args.jitter,
+        first_token=args.first_token,
+        chunks=args.chunks,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    server = make_server(args.host, args.port, options)
+    print(f'Stub inference API on http://{args.host}:{args.port}/chat/completions')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f'Served {server.stats.snapshot()}')
+
+
+if __name__ == '__main__':
+    main()
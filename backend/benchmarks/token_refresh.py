@@ -0,0 +1,90 @@
+"""
+Refresh throughput and queries per refresh with rotation + revocation.
+
+    python -m benchmarks.token_refresh
+
+Compares simplejwt's serializer without any revocation (replays allowed),
+a naive per-request database check-and-insert (roughly what the
+token_blacklist app costs), and the batched in-memory revocation store.
+"""
+import time
+
+from benchmarks import setup_test_database
+
+setup_test_database()
+
+from datetime import datetime, timezone as dt_timezone  # noqa: E402
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework_simplejwt.exceptions import TokenError  # noqa: E402
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+from authentication import serializers  # noqa: E402
+from authentication.models import RevokedToken  # noqa: E402
+from authentication.revocation import DatabaseRevocationStore  # noqa: E402
+
+REFRESHES = 2000
+
+
+class NaiveDatabaseStore:
+    """One lookup and one insert per refresh."""
+
+    def is_revoked(self, jti):
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, exp):
+        return RevokedToken.objects.get_or_create(
+            jti=jti, defaults={'expires_at': datetime.fromtimestamp(exp, tz=dt_timezone.utc)}
+        )[1]
+
+    def flush(self):
+        pass
+
+
+def run(serializer_class, token):
+    for _ in range(REFRESHES):
+        serializer = serializer_class(data={'refresh': token})
+        serializer.is_valid(raise_exception=True)
+        token = serializer.validated_data['refresh']
+    return token
+
+
+def measure(label, serializer_class, store=None):
+    RevokedToken.objects.all().delete()
+    if store is not None:
+        serializers.revocation_store = store
+    user = get_user_model().objects.get_or_create(username='bench')[0]
+    first = str(RefreshToken.for_user(user))
+
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        run(serializer_class, first)
+        elapsed = time.perf_counter() - start
+        if store is not None:
+            store.flush()
+
+    replay = 'allowed'
+    try:
+        run(serializer_class, first)
+    except TokenError:
+        replay = 'rejected'
+    print(
+        f'{label:<22} {REFRESHES / elapsed:8.0f} refreshes/s  '
+        f'{len(queries) / REFRESHES:.3f} queries/refresh  replay {replay}'
+    )
+
+
+def main():
+    measure('no revocation', TokenRefreshSerializer)
+    measure('naive database', serializers.RevokingTokenRefreshSerializer, NaiveDatabaseStore())
+    measure(
+        'batched store',
+        serializers.RevokingTokenRefreshSerializer,
+        DatabaseRevocationStore(batch_size=100, flush_interval=2.0, sync_interval=5.0, purge_interval=3600.0)
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,3 @@
 #!/bin/bash
 cd /opt/render/project/src/backend
-gunicorn aitodo.wsgi:application --bind 0.0.0.0:$PORT 
\ No newline at end of file
+gunicorn aitodo.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:$PORT 
\ No newline at end of file
@@ -46,12 +46,37 @@ const TodoApp: React.FC = () => {
   const [aiLoading, setAiLoading] = useState(false);
   const [aiDialogOpen, setAiDialogOpen] = useState(false);
   const [aiPlan, setAiPlan] = useState<AIPlanningResponse | null>(null);
+  const [aiDraft, setAiDraft] = useState('');
+  const [aiApplying, setAiApplying] = useState(false);
   const [anchorEl, setAnchorEl] = useState<null | HTMLElement>(null);
 
   useEffect(() => {
     fetchTodos();
   }, []);
 
+  useEffect(() => {
+    // Changes made on other devices (and echoes of our own) arrive as events
+    return apiService.subscribeToTodoEvents({
+      onChange: (event, todo) => setTodos(current => (
+        current.some(t => t.id === todo.id)
+          ? current.map(t => t.id === todo.id ? todo : t)
+          : event === 'created' ? [todo, ...current] : current
+      )),
+      onDelete: (id) => setTodos(current => current.filter(t => t.id !== id)),
+      onCatchUp: ({ changed, deleted }) => setTodos(current => {
+        // Changes made while the event stream was reconnecting
+        const updated = new Map(changed.map((todo): [number, Todo] => [todo.id, todo]));
+        const removed = new Set(deleted);
+        const added = changed.filter(todo => !current.some(t => t.id === todo.id));
+        return [
+          ...added,
+          ...current.filter(t => !removed.has(t.id)).map(t => updated.get(t.id) ?? t),
+        ];
+      }),
+      onResync: () => fetchTodos(),
+    });
+  }, []);
+
   const fetchTodos = async () => {
     try {
       setLoading(true);
@@ -103,17 +128,37 @@ const TodoApp: React.FC = () => {
 
     try {
       setAiLoading(true);
+      setAiPlan(null);
+      setAiDraft('');
+      setAiDialogOpen(true);
       const tasks = todos.map(todo => todo.title);
-      const plan = await apiService.planWithAI(tasks);
+      // Show the completion as it is generated instead of waiting for all of it
+      const plan = await apiService.planWithAIStream(tasks, text => setAiDraft(draft => draft + text));
       setAiPlan(plan);
-      setAiDialogOpen(true);
     } catch (error) {
       console.error('Error planning with AI:', error);
+      setAiDialogOpen(false);
     } finally {
       setAiLoading(false);
     }
   };
 
+  const handleApplyPlan = async () => {
+    if (!aiPlan) return;
+
+    try {
+      setAiApplying(true);
+      const { todos: created } = await apiService.applyAIPlan(aiPlan);
+      // The created events may have arrived first
+      setTodos(current => [...created.filter(todo => !current.some(t => t.id === todo.id)), ...current]);
+      setAiDialogOpen(false);
+    } catch (error) {
+      console.error('Error applying AI plan:', error);
+    } finally {
+      setAiApplying(false);
+    }
+  };
+
   const getPriorityColor = (priority: string) => {
     switch (priority) {
       case 'high': return 'error';
@@ -293,6 +338,11 @@ const TodoApp: React.FC = () => {
           </Box>
         </DialogTitle>
         <DialogContent>
+          {!aiPlan && (
+            <Typography variant="body2" color="text.secondary" sx={{ whiteSpace: 'pre-wrap', fontFamily: 'monospace' }}>
+              {aiDraft || 'Planning...'}
+            </Typography>
+          )}
           {aiPlan && (
             <Box>
               <Typography variant="h6" gutterBottom>
@@ -324,6 +374,9 @@ const TodoApp: React.FC = () => {
           )}
         </DialogContent>
         <DialogActions>
+          <Button onClick={handleApplyPlan} disabled={!aiPlan || aiApplying}>
+            Add as todos
+          </Button>
           <Button onClick={() => setAiDialogOpen(false)}>
             Close
           </Button>
@@ -1,10 +1,21 @@
 import axios, { AxiosInstance } from 'axios';
-import { User, Todo, AuthResponse, AIPlanningResponse, CreateTodoRequest } from '../types';
+import { User, Todo, AuthResponse, AIPlanningResponse, CreateTodoRequest, PaginatedResponse, TodoChanges, TodoStats } from '../types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'https://aitodo-backend.onrender.com/api';
 
+function tokenExpiresSoon(token: string): boolean {
+  // Only the expiry claim is read; the server checks the signature
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return payload.exp * 1000 - Date.now() < 30000;
+  } catch {
+    return true;
+  }
+}
+
 class ApiService {
   private api: AxiosInstance;
+  private refreshing: Promise<string | null> | null = null;
 
   constructor() {
     this.api = axios.create({
@@ -36,13 +47,8 @@ class ApiService {
         if (error.response?.status === 401 && !originalRequest._retry) {
           originalRequest._retry = true;
           try {
-            const refreshToken = localStorage.getItem('refresh_token');
-            if (refreshToken) {
-              const response = await axios.post(`${API_BASE_URL}/token/refresh/`, {
-                refresh: refreshToken,
-              });
-              const { access } = response.data;
-              localStorage.setItem('access_token', access);
+            const access = await this.refreshAccessToken();
+            if (access) {
               originalRequest.headers.Authorization = `Bearer ${access}`;
               return this.api(originalRequest);
             }
@@ -58,6 +64,31 @@ class ApiService {
     );
   }
 
+  private refreshAccessToken(): Promise<string | null> {
+    // Refresh tokens are single-use (rotated and revoked on refresh), so
+    // concurrent 401s must share one refresh and keep the rotated token.
+    if (!this.refreshing) {
+      this.refreshing = (async () => {
+        const refreshToken = localStorage.getItem('refresh_token');
+        if (!refreshToken) {
+          return null;
+        }
+        const response = await axios.post(`${API_BASE_URL}/token/refresh/`, {
+          refresh: refreshToken,
+        });
+        const { access, refresh } = response.data;
+        localStorage.setItem('access_token', access);
+        if (refresh) {
+          localStorage.setItem('refresh_token', refresh);
+        }
+        return access;
+      })().finally(() => {
+        this.refreshing = null;
+      });
+    }
+    return this.refreshing;
+  }
+
   // Authentication
   async googleAuth(token: string): Promise<AuthResponse> {
     const response = await this.api.post('/auth/google/', { token });
@@ -66,10 +97,118 @@ class ApiService {
 
   // Todos
   async getTodos(): Promise<Todo[]> {
-    const response = await this.api.get('/todos/');
+    // The list endpoint is cursor-paginated. Only the cursor is taken from
+    // `next`: behind a TLS-terminating proxy that absolute URL may say http://,
+    // which the browser would block as mixed content.
+    const todos: Todo[] = [];
+    let cursor: string | null = null;
+    do {
+      const response: { data: PaginatedResponse<Todo> } = await this.api.get('/todos/', {
+        params: cursor ? { cursor } : {},
+      });
+      todos.push(...response.data.results);
+      const next = response.data.next;
+      cursor = next ? new URL(next).searchParams.get('cursor') : null;
+    } while (cursor);
+    return todos;
+  }
+
+  async getTodoChanges(since?: string): Promise<TodoChanges> {
+    // Rows changed and ids deleted since `since`; full=true means replace everything
+    const response = await this.api.get('/todos/changes/', { params: since ? { since } : {} });
     return response.data;
   }
 
+  async getTodoStats(): Promise<TodoStats> {
+    const response = await this.api.get('/todos/stats/');
+    return response.data;
+  }
+
+  subscribeToTodoEvents(handlers: {
+    onChange: (event: 'created' | 'updated', todo: Todo) => void;
+    onDelete: (id: number) => void;
+    onCatchUp: (changes: TodoChanges) => void;
+    onResync: () => void;
+  }): () => void {
+    // EventSource cannot send an Authorization header, hence the query
+    // parameter. Reconnects are made here rather than by the browser, so
+    // that each one carries a current access token; the server ends every
+    // stream after a while. Every `ready` after the first is followed by a
+    // /changes/ fetch for whatever was published while disconnected.
+    let source: EventSource | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let closed = false;
+    let cursor: string | null = null;
+    let failures = 0;
+
+    const catchUp = async (since: string) => {
+      try {
+        const changes = await this.getTodoChanges(since);
+        if (closed) return;
+        if (changes.full) {
+          handlers.onResync();
+        } else {
+          handlers.onCatchUp(changes);
+        }
+      } catch {
+        if (!closed) handlers.onResync();
+      }
+    };
+
+    const reconnect = (refresh: boolean) => {
+      const delay = Math.min(3000 * 2 ** failures, 60000);
+      failures += 1;
+      retryTimer = setTimeout(() => connect(refresh), delay);
+    };
+
+    const connect = async (refresh: boolean) => {
+      let token = localStorage.getItem('access_token');
+      if (refresh || !token || tokenExpiresSoon(token)) {
+        try {
+          token = await this.refreshAccessToken();
+        } catch {
+          token = null;
+        }
+      }
+      if (closed) return;
+      if (!token) {
+        reconnect(true);
+        return;
+      }
+
+      const current = new EventSource(`${API_BASE_URL}/todos/events/?access_token=${encodeURIComponent(token)}`);
+      source = current;
+      let ready = false;
+      current.addEventListener('ready', (e) => {
+        ready = true;
+        failures = 0;
+        const since = cursor;
+        cursor = JSON.parse((e as MessageEvent).data).cursor;
+        if (since) catchUp(since);
+      });
+      current.addEventListener('created', (e) => handlers.onChange('created', JSON.parse((e as MessageEvent).data)));
+      current.addEventListener('updated', (e) => handlers.onChange('updated', JSON.parse((e as MessageEvent).data)));
+      current.addEventListener('deleted', (e) => handlers.onDelete(JSON.parse((e as MessageEvent).data).id));
+      current.addEventListener('resync', () => handlers.onResync());
+      current.onerror = () => {
+        // Also fired when the server ends the stream
+        current.close();
+        if (source === current && !closed) {
+          source = null;
+          // Refused before `ready`: most likely the token, so refresh it
+          reconnect(!ready);
+        }
+      };
+    };
+
+    connect(false);
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      source?.close();
+    };
+  }
+
   async createTodo(todo: CreateTodoRequest): Promise<Todo> {
     const response = await this.api.post('/todos/', todo);
     return response.data;
@@ -85,10 +224,59 @@ class ApiService {
   }
 
   // AI Planning
-  async planWithAI(tasks: string[]): Promise<AIPlanningResponse> {
-    const response = await this.api.post('/todos/plan/', { tasks });
+  async applyAIPlan(plan: AIPlanningResponse): Promise<{ todos: Todo[] }> {
+    // Creates the todos of the plan as shown, without planning again
+    const response = await this.api.post('/todos/plan/apply/', plan);
     return response.data;
   }
+
+  async planWithAIStream(tasks: string[], onDelta: (text: string) => void): Promise<AIPlanningResponse> {
+    // Server-Sent Events over a POST, which EventSource cannot send, so the
+    // stream is read and split into events by hand
+    const post = (token: string | null) => fetch(`${API_BASE_URL}/todos/plan/stream/`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify({ tasks }),
+    });
+    let response = await post(localStorage.getItem('access_token'));
+    if (response.status === 401) {
+      response = await post(await this.refreshAccessToken());
+    }
+    if (!response.ok || !response.body) {
+      throw new Error(`AI planning failed: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, end);
+        buffer = buffer.slice(end + 2);
+        const event = block.match(/^event: (.*)$/m)?.[1];
+        const data = block.match(/^data: (.*)$/m)?.[1];
+        if (!event || data === undefined) continue;
+        const payload = JSON.parse(data);
+        if (event === 'delta') {
+          onDelta(payload.text);
+        } else if (event === 'plan') {
+          reader.cancel();
+          return payload;
+        } else if (event === 'error') {
+          reader.cancel();
+          throw new Error(payload.error);
+        }
+      }
+    }
+    throw new Error('AI planning stream ended without a plan');
+  }
 }
 
 export const apiService = new ApiService(); 
\ No newline at end of file
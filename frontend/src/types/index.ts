@@ -14,6 +14,8 @@ export interface Todo {
   priority: 'low' | 'medium' | 'high';
   status: 'pending' | 'in_progress' | 'completed';
   due_date?: string;
+  plan_order?: number | null;
+  estimated_minutes?: number | null;
   created_at: string;
   updated_at: string;
 }
@@ -40,4 +42,23 @@ export interface CreateTodoRequest {
   priority?: 'low' | 'medium' | 'high';
   status?: 'pending' | 'in_progress' | 'completed';
   due_date?: string;
-} 
\ No newline at end of file
+} 
+export interface PaginatedResponse<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+export interface TodoChanges {
+  changed: Todo[];
+  deleted: number[];
+  cursor: string;
+  full: boolean;
+}
+
+export interface TodoStats {
+  total: number;
+  by_status: Record<'pending' | 'in_progress' | 'completed', number>;
+  by_priority: Record<'low' | 'medium' | 'high', number>;
+  overdue: number;
+}